@@ -3,27 +3,27 @@ import sys
 import warnings
 from topomesh import TopoMesh
 
-def calculate_opc(input_path, output_path, min_patch_size):
+def calculate_opc(input_path, output_path, min_patch_sizes):
     try:
-        # Load the .ply file
+        # Load the .ply or .off file
         mesh = TopoMesh(input_path)
-        # Calculate OPC
-        mesh.GenerateOPCR(min_patch_size)
-        # Save the OPC result to the output path
+        # Calculate OPC once for all minimum patch sizes
+        mesh.GenerateOPCR(min_patch_sizes, retain="counts")
+        # Save the OPC results (one per minimum patch size, comma separated) to the output path
         with open(output_path, 'w') as f:
-            f.write(str(mesh.OPCR))
+            f.write(",".join(str(opcr) for opcr in mesh.OPCR))
         print(f"OPC calculation completed. Result saved to {output_path}")
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
     if len(sys.argv) != 4:
-        print("Usage: python script.py input_file output_file min_patch_size")
+        print("Usage: python script.py input_file output_file min_patch_size[,min_patch_size,...]")
         sys.exit(1)
 
     input_file = sys.argv[1]
     output_file = sys.argv[2]
-    min_patch_size = int(sys.argv[3])
+    min_patch_sizes = [int(size) for size in sys.argv[3].split(',')]
 
     # Check if the input file exists
     if not os.path.isfile(input_file):
@@ -31,4 +31,4 @@ if __name__ == "__main__":
         sys.exit(1)
 
     # Calculate OPC for the single input file
-    calculate_opc(input_file, output_file, min_patch_size)
+    calculate_opc(input_file, output_file, min_patch_sizes)
@@ -8,14 +8,11 @@ further details on method.
 @author: Julia M. Winchester
 '''
 
-import implicitfair
-import normcore
+import meshcheck
 from copy import copy as pcopy
-from numpy import zeros, transpose, nonzero, sqrt, sum, trace, mat, array, dot, isnan, copy, array_equal
-from numpy.linalg import cond, LinAlgError
-from scipy.sparse import lil_matrix
+from numpy import zeros, nonzero, sqrt, sum, trace, isnan, isfinite, where, identity, inf, unique, sort, atleast_1d, argmin, absolute
+from numpy.linalg import cond, inv, det, LinAlgError
 from scipy.stats import scoreatpercentile
-from collections import defaultdict
 
 class MeshDNE(object):
     """Class for calculating and storing Dirichlet normal energy values for polygonal mesh data. 
@@ -39,8 +36,6 @@ class MeshDNE(object):
     
     Attributes:
         Mesh (TopoMesh object): Triangulated polygon mesh data. 
-        vert_tri_dict (dict): Associates vertex index keys with related
-            face index values. 
         edgeverts (ndarray): Pairs of vertices that form surface boundary edges.
         fnormal (ndarray): Normalized unit normals of surface polygons. 
         vnormal (ndarray): Normalized approximated unit normals of surface
@@ -56,6 +51,8 @@ class MeshDNE(object):
             removal is on, these are not counted toward DNE. 
         boundary_faces (list): Polygons forming mesh edges. Not counted toward
             DNE.
+        duplicate_vertex_faces (ndarray): Polygons with duplicate vertices. Not 
+            counted toward DNE. Taken from the mesh check when the mesh is unchanged.
         nan_faces (list): Any polygons resulting in NAN e values.
         filename (string): Filename of current mesh. Unused for now.  
     """
@@ -70,7 +67,6 @@ class MeshDNE(object):
         self.outliertype = outliertype
         self.fname = fname
         
-        self.vert_tri_dict = None
         self.edgeverts = None
         self.fnormal = None
         self.vnormal = None
@@ -83,19 +79,28 @@ class MeshDNE(object):
         self.outlier_faces = list()
         self.boundary_faces = list()
         self.nan_faces = list()
+        self.duplicate_vertex_faces = None
         
         self.calcdne()
         
     def calcdne(self):
         """Method for calculating surface Dirichlet normal energy and populating instance variables."""
-        # creation of dictionary of vertex keys and face values     
-        self._get_vert_tri_dict()
+        if self._prepare_surface() == "!":
+            return "!"
         
+        # array of e(p) and face area for polygons across mesh
+        self._energize_surface()
+        
+        self._sumdne()
+
+    def _prepare_surface(self):
+        """Smooths mesh if requested and finds edges, boundary polygons, normals and duplicate vertex polygons."""
         # optional implicit smooth of mesh
         if self.dosmooth == 1:
+            smoothed = self.Mesh.smoothcache.smooth(self.Mesh.vertices, self.Mesh.faces, int(self.smoothit), float(self.smoothstep))
             self.Mesh = pcopy(self.Mesh)
-            self.Mesh.vertices = implicitfair.smooth(self.Mesh.vertices, self.Mesh.faces, int(self.smoothit), float(self.smoothstep), self.vert_tri_dict)
-            if self.Mesh.vertices == "!":
+            self.Mesh.vertices = smoothed
+            if isinstance(self.Mesh.vertices, str):
                 print("Cholesky error")
                 return "!"    
 
@@ -105,65 +110,82 @@ class MeshDNE(object):
         self._get_boundary_faces()
         
         # arrays of normalized face normals and vertex normals approximated from adjacent faces
-        self.vnormal, self.fnormal = normcore.computenormal(self.Mesh.vertices, self.Mesh.faces, self.Mesh.triverts, self.vert_tri_dict)
-        # array of e(p) and face area for polygons across mesh
-        
-        self._energize_surface()
-        
-        self._sumdne()
+        self.vnormal, self.fnormal = self.Mesh.normals
+        # polygons with duplicate vertices, ignored for energy calculation
+        self._get_duplicate_vertex_faces()
 
+    def _get_duplicate_vertex_faces(self):
+        """Finds polygons with duplicate vertices, reusing the mesh check if it was run on the current mesh."""
+        if self.Mesh.meshcheck is not None and self.Mesh.meshcheck.matches(self.Mesh):
+            self.duplicate_vertex_faces = self.Mesh.meshcheck.duplicate_vertex_faces
+        else:
+            self.duplicate_vertex_faces = nonzero(meshcheck.duplicate_vertex_faces(self.Mesh.vertices, self.Mesh.faces))[0]
+        
+        if len(self.duplicate_vertex_faces) > 0:
+            print("Warning: Duplicate vertices in %s polygons." % len(self.duplicate_vertex_faces))
+            print("Ignoring these polygons for energy calculation, but editing surface to remove duplicate vertices prior to DNE calculation is encouraged.")
+    
     def _energize_surface(self):
-        """Calculates energy values and polygon areas across a surface."""    
-        energy_and_facearea = array([self._energy(face, i) for i, face in enumerate(self.Mesh.faces)])
-        self.e = energy_and_facearea[:,0]
-        self.facearea = energy_and_facearea[:,1]
-
-    def _energy(self, face, i):
-        """Returns energy value and polygon area for a provided polygon."""
-       
-        TV1 = array([self.Mesh.vertices[face[0]], self.Mesh.vertices[face[1]], self.Mesh.vertices[face[2]]])
-        TV2 = array([self.vnormal[face[0]],self.vnormal[face[1]],self.vnormal[face[2]]])
-        
-        if array_equal(TV1[0], TV1[1]) or array_equal(TV1[0], TV1[2]) or array_equal(TV1[1], TV1[2]):
-            print("Warning: Duplicate vertices in polygon %s." % i)
-            print("Ignoring this polygon for energy calculation, but editing surface to remove duplicate vertices prior to DNE calculation is encouraged.")
-            return [0,1]
-
-        b1 = TV1[1] - TV1[0]
-        b2 = TV1[2] - TV1[0]
+        """Calculates energy values and polygon areas across a surface.
         
-        g = array(([dot(b1,b1), dot(b1,b2)],[dot(b2,b1), dot(b2,b2)]))
+        Energy of each polygon is trace(G^-1 * F*h), where G is the 2x2 Gram matrix
+        of two polygon edge vectors and F*h the same for the differences in vertex
+        normals along those edges. Matrices for all polygons are built and
+        inverted at once as (number of polygons, 2, 2) arrays."""
+        g, fstarh, gdet = self._gram_matrices()
+        
+        # polygons with duplicate vertices or high condition numbers get energy 0 and area 1
+        ignored = zeros(self.Mesh.nface, bool)
+        ignored[self.duplicate_vertex_faces] = True
         
         if self.docondition:
-                if cond(g) > 10**5:
-                    self.high_condition_faces.append([i, cond(g)])
-                    return [0,1]
+            highcondition = nonzero(~ignored & (self._condition(g, gdet) > 10**5))[0]
+            self.high_condition_faces = [[i, condition] for i, condition in zip(highcondition.tolist(), cond(g[highcondition]).tolist())]
+            ignored[highcondition] = True
         
-        c1 = TV2[1] - TV2[0]
-        c2 = TV2[2] - TV2[0]
-    
-        fstarh = array(([dot(c1,c1), dot(c1,c2)], [dot(c2,c1), dot(c2,c2)]))
-    
-        gm = mat(g)  
+        g[ignored] = identity(2)
         
         try:
-            gminv = gm.I
+            gminv = inv(g)
         except LinAlgError as err:
-            condition = cond(g)
-            if condition > 10**5:
-                err.args += ('G matrix for polygon %s is singular and an inverse cannot be determined. Condition number is %s, turning condition number checking on will cause this polygon to be ignored for energy calculation.' % (i, cond(g)),)
+            # polygon reported in the error message, the closest to singular if none is exactly singular
+            counted = nonzero(~ignored)[0]
+            singular = [i for i in counted if gdet[i] == 0 or not isfinite(cond(g[i]))]
+            i = singular[0] if singular else counted[argmin(absolute(gdet[counted]))]
+            if cond(g[i]) > 10**5:
+                err.args += ('G matrix for polygon %s is singular and an inverse cannot be determined. Condition number is %s, turning condition number checking on will cause this polygon to be ignored for energy calculation.' % (i, cond(g[i])),)
                 raise
             else:
-                err.args += ('G matrix for polygon %s is singular and an inverse cannot be determined. Condition number is %s, turning condition number checking on will not cause this polygon to be ignored for energy calculation. Further mesh processing is advised.' % (i, cond(g)),)
+                err.args += ('G matrix for polygon %s is singular and an inverse cannot be determined. Condition number is %s, turning condition number checking on will not cause this polygon to be ignored for energy calculation. Further mesh processing is advised.' % (i, cond(g[i])),)
                 raise
         
-        e = trace((gminv*fstarh))
-        facearea = 0.5 * sqrt(g[0,0]*g[1,1]-g[0,1]*g[1,0])
-                        
-        if isnan(e):
-            self.nan_faces.append(i)
-            
-        return [e,facearea]
+        self.e = trace(gminv @ fstarh, axis1=1, axis2=2)
+        self.facearea = self.Mesh.face_areas.copy()
+        
+        self.e[ignored] = 0
+        self.facearea[ignored] = 1
+        
+        self.nan_faces = nonzero(isnan(self.e))[0].tolist()
+
+    def _gram_matrices(self):
+        """Returns G and F*h matrices of all polygons as (number of polygons, 2, 2) arrays, and determinants of G."""
+        TV1 = self.Mesh.vertices[self.Mesh.faces]
+        TV2 = self.vnormal[self.Mesh.faces]
+        
+        b = TV1[:,1:] - TV1[:,:1] # polygon edge vectors b1, b2
+        c = TV2[:,1:] - TV2[:,:1] # vertex normal differences c1, c2
+        
+        g = b @ b.transpose(0,2,1)
+        fstarh = c @ c.transpose(0,2,1)
+        gdet = g[:,0,0]*g[:,1,1] - g[:,0,1]*g[:,1,0]
+        
+        return g, fstarh, gdet
+
+    def _condition(self, g, gdet):
+        """Returns condition numbers of symmetric 2x2 matrices g with determinants gdet, from their eigenvalues."""
+        maxeigen = 0.5*(g[:,0,0] + g[:,1,1]) + sqrt((0.5*(g[:,0,0] - g[:,1,1]))**2 + g[:,0,1]**2)
+        # smallest eigenvalue is gdet/maxeigen, so condition is maxeigen**2/gdet 
+        return where(gdet > 0, maxeigen**2 / where(gdet > 0, gdet, 1), inf)
     
     def _sumdne(self):
         """Sums energy values * face areas, ignoring certain kinds of polygons depending on parameters."""
@@ -171,7 +193,7 @@ class MeshDNE(object):
         self.e[self.boundary_faces] = 0
         
         # energy density is e(p) * area of polygon        
-        self.equantity = array([x*y for x, y in zip(self.e, self.facearea)])
+        self.equantity = self.e * self.facearea
         
         # optional removal of top outliers, percentile for outliers is user settable
         if self.dooutlier: 
@@ -182,61 +204,107 @@ class MeshDNE(object):
     def _outlierremove(self):
         """Flags outlier faces based on parameters and removes associated energy values."""
         switcharoo = [self.e, self.equantity]
-        percentile = scoreatpercentile(switcharoo[self.outliertype], self.outlierperc)
-        for i, energy in enumerate(switcharoo[self.outliertype]):
-            if energy > percentile or isnan(energy):
-                self.outlier_faces.append([i, energy, self.facearea[i]])
-                self.equantity[i] = 0
+        energy = switcharoo[self.outliertype]
+        percentile = scoreatpercentile(energy, self.outlierperc)
+        outliers = nonzero((energy > percentile) | isnan(energy))[0]
+        self.outlier_faces = [list(outlier) for outlier in zip(outliers.tolist(), energy[outliers].tolist(), self.facearea[outliers].tolist())]
+        self.equantity[outliers] = 0
 
-    def _get_vert_tri_dict(self):
-        """Generates dictionary associating vertex index keys with related polygon index values.""" 
-        self.vert_tri_dict = defaultdict(list)
-        
-        for findex, face in enumerate(self.Mesh.faces):
-            for vertex in face:
-                self.vert_tri_dict[vertex].append(findex)
-                        
     def _get_edge_verts(self):
-        """Generates pairs of vertices comprising surface edges."""
-        M = lil_matrix((self.Mesh.nvert,self.Mesh.nvert))
-        
-        nedge = 0
-    
-        for face in self.Mesh.faces:
-            v1, v2, v3 = face    
-            
-            if M[v1,v2] == 0:
-                nedge += 1
-                M[v1,v2] = nedge
-                M[v2,v1] = nedge
-                
-            if M[v3,v1] == 0:
-                nedge += 1
-                M[v1,v3] = nedge
-                M[v3,v1] = nedge
-                
-            if M[v2,v3] == 0:
-                nedge += 1
-                M[v3,v2] = nedge
-                M[v2,v3] = nedge
-            
-        self.edgeverts = zeros([nedge,2], int)
-        
-        nonzeroarray = transpose(nonzero(M))
-        
-        for entry in nonzeroarray:
-            self.edgeverts[M[entry[0],entry[1]]-1] = [entry[0],entry[1]]
+        """Generates pairs of vertices comprising surface edges, in order of first use by polygons."""
+        # polygon edges in the order v1-v2, v3-v1, v2-v3
+        edgeindex = self.Mesh.topology.face_edges[:,[0,2,1]].ravel()
+        _, firstuse = unique(edgeindex, return_index=True)
+        self.edgeverts = self.Mesh.topology.edges[edgeindex[sort(firstuse)]][:,::-1]
     
     def _get_boundary_faces(self):
         """Generates list of polygons comprising surface edges."""        
-        self.boundary_faces = list()
+        self.boundary_faces = self.Mesh.topology.boundary_faces.tolist()
+
+
+class MeshDNESweep(MeshDNE):
+    """Class for calculating and storing Dirichlet normal energy under many outlier and condition number settings.
+    
+    Energy values, polygon areas and condition numbers are calculated once, and
+    DNE is then summed for every combination of outlier percentile, outlier type
+    and condition number cutoff. DNE for each combination is the same as given
+    by MeshDNE with those settings. Attributes of MeshDNE describing the surface
+    (edges, boundary polygons, normals, duplicate vertex polygons, e, facearea
+    and nan_faces) are populated, as well as those listed below. e and facearea
+    are given with only duplicate vertex polygons ignored.
+    
+    Args:
+        TopoMesh (TopoMesh object): Triangulated polygon mesh data. 
+        dosmooth (bool): Whether or not mesh should be smoothed prior to DNE 
+            calculation. 
+        smoothit (int): Number of iterations for smoothing. 
+        smoothstep (float): Step size for smoothing
+        outlierpercs (list): Percentiles above which to remove energy outliers.
+            None turns outlier removal off. 
+        outliertypes (list): Outlier types, energy*face values (1) or energy
+            values (0).
+        conditions (list): Condition numbers above which polygons are ignored
+            for energy calculation. None turns condition number checking off.
+    
+    Attributes:
+        condition_numbers (ndarray): Condition numbers of polygon G matrices.
+        dne_table (list): Rows of outlier percentile, outlier type, condition
+            number cutoff and DNE for every combination of settings. DNE is NaN
+            for settings that would leave a polygon with a singular G matrix.
+    """
+    def __init__(self, TopoMesh, dosmooth, smoothit, smoothstep, outlierpercs=(99.9,), outliertypes=(0,), conditions=(10**5,), fname=""):
+        self.outlierpercs = list(outlierpercs)
+        self.outliertypes = list(outliertypes)
+        self.conditions = list(conditions)
+        self.condition_numbers = None
+        self.dne_table = list()
+        
+        # condition and outlier settings of MeshDNE are unused
+        MeshDNE.__init__(self, TopoMesh, dosmooth, smoothit, smoothstep, 0, 0, 0, 0, fname)
         
-        for verts in self.edgeverts:
-            f1, f2 = [self.vert_tri_dict[vert] for vert in verts]
-            cf = [x for x in f2 for y in f1 if x == y]
+    def calcdne(self):
+        """Method for calculating surface Dirichlet normal energy under every combination of settings."""
+        if self._prepare_surface() == "!":
+            return "!"
+        
+        g, fstarh, gdet = self._gram_matrices()
+        self.condition_numbers = self._condition(g, gdet)
+        
+        ignored = zeros(self.Mesh.nface, bool)
+        ignored[self.duplicate_vertex_faces] = True
+        # G matrices inv() cannot invert are those with a zero pivot, so an LU determinant of exactly 0. The
+        # analytic determinant of a near-degenerate polygon can round to 0 or below while inv() still succeeds.
+        g[ignored] = identity(2)
+        singular = ~ignored & (det(g) == 0)
+        
+        g[singular] = identity(2)
+        self.e = trace(inv(g) @ fstarh, axis1=1, axis2=2)
+        self.facearea = self.Mesh.face_areas.copy()
+        self.e[ignored] = 0
+        self.facearea[ignored] = 1
+        self.nan_faces = nonzero(isnan(self.e) & ~singular)[0].tolist()
+        
+        for condition in self.conditions:
+            skipped = ignored if condition is None else ignored | (self.condition_numbers > condition)
+            
+            if (singular & ~skipped).any():
+                self.dne_table += [[perc, outliertype, condition, float('nan')] for outliertype in self.outliertypes for perc in self.outlierpercs]
+                continue
             
-            if len(cf) == 1:
-                self.boundary_faces.append(cf[0])
+            e = where(skipped, 0, self.e)
+            e[self.boundary_faces] = 0
+            equantity = e * where(skipped, 1, self.facearea)
             
-        self.boundary_faces = list(set(self.boundary_faces))
-    
\ No newline at end of file
+            for outliertype in self.outliertypes:
+                energy = [e, equantity][outliertype]
+                percs = [perc for perc in self.outlierpercs if perc is not None]
+                # one sort of energy values for all percentiles
+                percentiles = dict(zip(percs, atleast_1d(scoreatpercentile(energy, percs)))) if percs else dict()
+                
+                for perc in self.outlierpercs:
+                    if perc is None:
+                        dne = round(sum(equantity),3)
+                    else:
+                        outliers = (energy > percentiles[perc]) | isnan(energy)
+                        dne = round(sum(where(outliers, 0, equantity)),3)
+                    self.dne_table.append([perc, outliertype, condition, dne])
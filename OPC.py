@@ -9,52 +9,88 @@ details on method.
 '''
 
 from copy import copy as pcopy
-from numpy import array, matrix, mat, transpose, average, subtract, row_stack
+from numpy import array, average, arange, cos, sin, arctan2, degrees, radians, int8
 from numpy import mean as amean
-from collections import defaultdict
+from numpy import ones, bincount, cumsum, where, int32, ndarray
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 
 import math
 import normcore
 
+# OPCR rotations around the Z-axis, in radians
+OPCR_ROTATIONS = arange(8) * math.radians(5.625)
+
+# Colors of XY aspect bins 0-7, followed by black for flat polygons (bin -1)
+OPC_COLORS = array(['#FF0000','#964B00','#FFFF00','#00FFFF','#0000FF','#90EE90','#014421','#FFC0CB','#000000'])
+
+RETAIN_LEVELS = ('counts', 'labels', 'full')
+
 class MeshOPCR(object):
     """Class for calculating and storing Orientation patch count rotated values for polygonal mesh data. 
     
     When instanced, this class calculates OPCR and associated variables
-    and stores them. All attributes listed below are populated on instantiation.
+    and stores them. All attributes listed below are populated on instantiation,
+    except those not kept at the requested retain level, which are left as None.
     
     Args:
         TopoMesh (TopoMesh object): Triangulated polygon mesh data. 
-        minpatch (int): Minimum size in polygons for patches to be counted. 
+        minpatch (int or list): Minimum size in polygons for patches to be
+            counted. If a list of sizes is given, patches are found once and
+            OPC is counted at every size. 
+        retain (str): 'counts' (keep only opc_list and OPCR, for batch runs),
+            'labels' (also keep patches_list) or 'full' (also keep aspect
+            bins, normals and vert_tri_dict). 
     
     Attributes:
         Mesh (TopoMesh object): Triangulated polygon mesh data. 
-        theta (float): Radians of OPC rotations for OPCR calculation. 
         n_rotations (int, 8): Number of OPC rotations for OPCR calculation.
+        rotations (ndarray): Radians of each OPC rotation around the Z-axis.
+        min_patch_sizes (list): Minimum patch sizes OPC is counted at.
         opc_list (list): List of OPC at each of 8 rotations. The average
-            of these values is OPCR. 
-        patches_list (list): List of lists. Contains 8 lists (one per
-            rotation), each of which lists all counted surface patches for 
-            that rotation.
-        colormap_list (list): List of lists. Contains 8 lists (one per
-            rotation), each of which lists polygons sorted into colors
-            based on XY aspect (direction that polygon faces) for that
-            rotation. 
+            of these values is OPCR. If minpatch is a list, contains one
+            such list per minimum patch size. 
+        patches_list (list): List of arrays. Contains 8 arrays (one per
+            rotation), each of which gives the counted surface patch of
+            every polygon for that rotation (-1 for polygons outside
+            counted patches), at the first minimum patch size. Kept for
+            'labels' and 'full'.
+        aspect_bins (ndarray): Color bin (0-7) of each polygon at each of 8
+            rotations, sorted by XY aspect (direction that polygon faces), as
+            an int8 array of shape (8, number of polygons). Flat polygons are
+            given bin -1. Colors for visualization are given by colormap.
+            Kept for 'full'.
         vert_tri_dict (dict): Associates vertex index keys with related
-            face index values. 
+            face index values. Kept for 'full'.
         fnormal (ndarray): Normalized unit normals of surface polygons. 
+            Kept for 'full'.
         vnormal (ndarray): Normalized approximated unit normals of surface
             vertices (approximated as average of normals of associated faces).
-        OPCR (float): Orientation patch count rotated. Average of opc_list.     
+            Kept for 'full'.
+        OPCR (float or list): Orientation patch count rotated. Average of
+            opc_list. If minpatch is a list, contains one OPCR per minimum
+            patch size.     
     """
-    def __init__(self, TopoMesh, minpatch):
+    def __init__(self, TopoMesh, minpatch, retain="full"):
+        if retain not in RETAIN_LEVELS:
+            raise ValueError('OPC retain level must be one of %s, not %s.' % (', '.join(RETAIN_LEVELS), retain))
+        
         self.Mesh = TopoMesh
-        self.MeshRotated = None
-        self.min_patch_size = int(minpatch)
-        self.theta = math.radians(5.625)
-        self.n_rotations = 8
-        self.opc_list = [None, None, None, None, None, None, None, None]
-        self.patches_list = [None, None, None, None, None, None, None, None]
-        self.colormap_list = [None, None, None, None, None, None, None, None]
+        # strings are single sizes, as int() accepts them
+        if isinstance(minpatch, (list, tuple, ndarray)):
+            if len(minpatch) == 0:
+                raise ValueError('OPC requires at least one minimum patch size, not an empty list.')
+            self.min_patch_size = [int(size) for size in minpatch]
+            self.min_patch_sizes = self.min_patch_size
+        else:
+            self.min_patch_size = int(minpatch)
+            self.min_patch_sizes = [self.min_patch_size]
+        self.retain = retain
+        self.rotations = self._get_rotations()
+        self.n_rotations = len(self.rotations)
+        self.opc_list = [None] * self.n_rotations
+        self.patches_list = [None] * self.n_rotations
+        self.aspect_bins = None
         self.vert_tri_dict = None
         self.fnormal = None
         self.vnormal = None
@@ -63,140 +99,154 @@ class MeshOPCR(object):
         self.calcopcr()
                
     def calcopcr(self):
-        """Method for calculating OPCR and associated variables from surface mesh. Calls internal methods."""
+        """Method for calculating OPCR and associated variables from surface mesh. Calls internal methods.
+        
+        Rotating a mesh around the Z-axis does not change which polygons share
+        edges and only adds the rotation angle to the XY aspect of every polygon,
+        so normals and adjacency are found once and each rotation only re-bins
+        the aspect angles."""
+        self.Mesh.topology # builds mesh topology before copying so copies share it
+        
         self.Mesh = pcopy(self.Mesh)
         self.Mesh.vertices = self._centermesh(self.Mesh.vertices)
-        self.MeshRotated = pcopy(self.Mesh)
         
-        self._get_vert_tri_dict()
+        self.vnormal, self.fnormal = normcore.computenormal(self.Mesh.vertices, self.Mesh.faces, topology=self.Mesh.topology)
+        self._get_aspect_bins()
+        
+        for i in range(self.n_rotations):
+            self.opc_list[i], patches = self._get_opc(self.aspect_bins[i])
+            if self.retain != 'counts':
+                self.patches_list[i] = patches
         
-        self.opc_list[0], self.patches_list[0], self.colormap_list[0] = self._get_opc(self.Mesh.vertices, 
-                                                                                      self.Mesh.faces, 
-                                                                                      self.Mesh.triverts)
+        # one list of OPC at all rotations per minimum patch size
+        self.opc_list = [list(opcs) for opcs in zip(*self.opc_list)]
+        self.OPCR = [average(opcs) for opcs in self.opc_list]
         
-        for i in range(1,self.n_rotations):
-                self._rotatemesh()
-                self.opc_list[i], self.patches_list[i], self.colormap_list[i] = self._get_opc(self.MeshRotated.vertices, 
-                                                                                              self.MeshRotated.faces, 
-                                                                                              self.MeshRotated.triverts)
+        if not isinstance(self.min_patch_size, list):
+            self.opc_list = self.opc_list[0]
+            self.OPCR = self.OPCR[0]
         
-        self.OPCR = average(self.opc_list)
+        if self.retain == 'full':
+            self._get_vert_tri_dict()
+        else:
+            self.aspect_bins = None
+            self.fnormal = None
+            self.vnormal = None
         
-    def _get_opc(self, vertices, faces, triverts):
-        """Calculates and returns OPC, list of patches, and list of polygons sorted into color bins by XY aspect."""
-        self.vnormal, self.fnormal = normcore.computenormal(vertices, faces, triverts, self.vert_tri_dict)
+    def _get_aspect_bins(self):
+        """Sorts polygons into color bins by XY aspect at every rotation."""
+        orientation_map = self._xydegrees(self.fnormal[:,1], self.fnormal[:,0])
+        rotations = self.rotations[:,None]
         
-        flatfaces = array([i for i, norm in enumerate(self.fnormal) if (norm[0:1] == 0).all()], dtype=int)
-        orientation_map = array([self._xydegrees(norm[1],norm[0]) for norm in self.fnormal])
-    
-        color_map = array([self._sort_to_colors(aspect_theta) for aspect_theta in orientation_map])
-        color_map[flatfaces] = '#000000'
-            
-        pairdict = defaultdict(list) #lists per vertex all possible pairs of polygons that include that vertex 
-        for vertex, faces in self.vert_tri_dict.items():
-            pairdict[vertex] = self._pair_faces(faces)
-            
-        adjacent_face_pairs = self._adjacent_face_pairs(pairdict)    
-        
-        same_color_pairs = [pair for pair in adjacent_face_pairs if color_map[pair[0]] == color_map[pair[1]]]
-        
-        color_face_dict = defaultdict(list) # lists adjacent polygon pairs for each color bin
-        for item in same_color_pairs:
-            color_face_dict[color_map[item[0]]].append(item)
-         
-        colorlist = ['#FF0000','#964B00','#FFFF00','#00FFFF','#0000FF','#90EE90','#014421','#FFC0CB']
-            
-        patches = [self._build_patches(color_face_dict[color]) for color in colorlist]
-
-        patches = [self._cull_small_patches(subpat,self.min_patch_size) for subpat in patches]
+        self.aspect_bins = ((orientation_map + degrees(rotations) + 22.5) % 360 // 45).astype(int8)
+        
+        # polygons with no X component after rotation are treated as flat
+        rotated_x = cos(rotations)*self.fnormal[:,0] - sin(rotations)*self.fnormal[:,1]
+        self.aspect_bins[rotated_x == 0] = -1
         
-        opc = sum([len(subpat) for subpat in patches])
+    def _get_opc(self, bins):
+        """Given color bin of each polygon, returns OPC at each minimum patch size and counted patch of each polygon at the first."""
+        face_pairs = self.Mesh.topology.face_pairs # polygon pairs sharing an edge
+        pair_bins = bins[face_pairs[:,0]]
+        same_color_pairs = face_pairs[(pair_bins == bins[face_pairs[:,1]]) & (pair_bins >= 0)]
+        
+        labels, sizes = self._label_patches(same_color_pairs, len(bins))
+        patches, opc = self._cull_small_patches(labels, sizes, self.min_patch_sizes[0])
+        opc = [opc] + [self._count_patches(sizes, minsize) for minsize in self.min_patch_sizes[1:]]
            
-        return [opc, patches, color_map]               
+        return [opc, patches]               
+
+    def _get_rotations(self):
+        """Returns radians of each OPC rotation around the Z-axis."""
+        return OPCR_ROTATIONS.copy()
 
     def _centermesh(self, vert_sequence):
         """Translates mesh centroid to XYZ coordinate origin."""
         centroid = amean(vert_sequence, axis=0)
-        return array([subtract(vert,centroid) for vert in vert_sequence])
+        return vert_sequence - centroid
 
     def _get_vert_tri_dict(self):
         """Generates dictionary associating vertex index keys with related polygon index values.""" 
-        self.vert_tri_dict = defaultdict(list)
-        
-        for findex, face in enumerate(self.Mesh.faces):
-            for vertex in face:
-                self.vert_tri_dict[vertex].append(findex)        
+        self.vert_tri_dict = self.Mesh.topology.vert_tri_dict()
 
-    def _rotatemesh(self):
-        """Rotates mesh theta radians around Z-axis."""
-        zrotmat = matrix([[math.cos(self.theta),(-1*math.sin(self.theta)),0],[math.sin(self.theta),math.cos(self.theta),0],[0,0,1]])
-        
-        vert_matrix = mat(self.MeshRotated.vertices)
-        rotated_verts = row_stack([transpose(zrotmat * transpose(vert)) for vert in vert_matrix])
-        self.MeshRotated.vertices = array(rotated_verts)
+    def colormap(self, rotation=0):
+        """Returns array of hex colors of polygons sorted into color bins by XY aspect at a given rotation, for visualization."""
+        if self.aspect_bins is None:
+            raise ValueError("OPC aspect bins are only kept with retain='full'.")
+        return OPC_COLORS[self.aspect_bins[rotation]]
 
     def _xydegrees(self, y, x):
-        """Given a vector (x,y) returns angle of vector from the positive X-axis."""
-        vectangle = math.degrees(math.atan2(y,x))
-        if vectangle < 0:
-            return vectangle+360
-        else:
-            return vectangle
-        
-    def _sort_to_colors(self, aspect_theta):
-        """Given a polygon XY aspect angle, returns the appropriate bin for color sorting."""
-        colorlist = ['#FF0000','#964B00','#FFFF00','#00FFFF','#0000FF','#90EE90','#014421','#FFC0CB']
-        modtheta = (aspect_theta + 22.5) % 360
-        group = int(modtheta//45)
-        return colorlist[group]
+        """Given vectors (x,y) returns angles of vectors from the positive X-axis, from 0 to 360 degrees."""
+        vectangle = degrees(arctan2(y,x))
+        return where(vectangle < 0, vectangle+360, vectangle)
+        
+    def _label_patches(self, face_pairs, nface): 
+        """Given a list of adjacent pairs of polygons on a surface, returns patch label of each polygon and size of each patch, where patches are contiguous polygons joined by provided pairs."""
+        graph = csr_matrix((ones(len(face_pairs), dtype=bool), (face_pairs[:,0], face_pairs[:,1])), shape=(nface, nface))
+        npatch, labels = connected_components(graph, directed=False)
+        return labels.astype(int32), bincount(labels, minlength=npatch)
     
-    def _pair_faces(self, inputlist):
-        """Given a list of numbers, returns all possible pairs of numbers without replication or identical-number pairs."""
-        return [(x,y) for x in set(inputlist) for y in set(inputlist) if x < y]
+    def _cull_small_patches(self, labels, sizes, minsize):
+        """Given polygon patch labels and patch sizes, returns labels renumbered over patches with numbers of polygons equal to or greater than minsize (-1 for other polygons) and number of these patches.
+        
+        Single polygons are never counted as patches, so minsize is at least 2."""
+        counted = sizes >= max(minsize, 2)
+        newlabels = where(counted, cumsum(counted) - 1, -1).astype(int32)
+        return newlabels[labels], int(counted.sum())
     
-    def _adjacent_face_pairs(self, pairdict):
-        """Given a list of polygon face pairs sharing vertices, returns the subset of polygon pairs where pair members share an edge.""" 
-        touching_list = list() 
-        seen = set() 
-        seentwice = set()
-        for item in pairdict:
-            for pair in pairdict[item]:
-                if pair in seen:
-                    touching_list.append(pair)
-                    if pair in seentwice:
-                        pass  # Do nothing
-                    else:
-                        seentwice.add(pair)
-                else:
-                    seen.add(pair)
-        return touching_list    
+    def _count_patches(self, sizes, minsize):
+        """Given patch sizes, returns number of patches with numbers of polygons equal to or greater than minsize (at least 2)."""
+        return int((sizes >= max(minsize, 2)).sum())
+
 
-    def _build_patches(self, face_pairs): 
-        """Given a list of adjacent pairs of polygons on a surface, returns list of all contiguous patches of polygons involving provided pairs."""
-        patcheslist = list()
-        for pair in face_pairs:
-            wassorted = list()
-            for i, clumppatch in enumerate(patcheslist):
-                if pair[0] in clumppatch or pair[1] in clumppatch:
-                    clumppatch.add(pair[0])
-                    clumppatch.add(pair[1])
-                    wassorted.append(i)
-                    continue
-            
-            if len(wassorted) == 0:
-                patcheslist.append(set([pair[0],pair[1]]))
-            
-            if len(wassorted) > 1:
-                tempset = set()
-                for sortpair in wassorted:
-                    tempset = tempset | patcheslist[sortpair]
-                patcheslist[wassorted[0]] = tempset
-                for i in wassorted[1:]:
-                    del patcheslist[i]
-        
-        return patcheslist
+class MeshOPCSweep(MeshOPCR):
+    """Class for calculating and storing orientation patch count over many rotations around the Z-axis, for testing how OPC depends on mesh orientation.
     
-    def _cull_small_patches(self, patches, minsize):
-        """Given a list of patches, returns only patches with numbers of polygons equal to or greater than minsize."""
-        return [patch for patch in patches if len(patch) >= minsize]
+    As in MeshOPCR, normals and polygon adjacency are found once and only the
+    aspect bins change between rotations. Color bins repeat every 45 degrees,
+    so rotations spread evenly over 45 degrees cover all orientations. All
+    attributes of MeshOPCR are populated, with one entry per rotation, as
+    well as those listed below. 
     
+    Args:
+        TopoMesh (TopoMesh object): Triangulated polygon mesh data. 
+        minpatch (int or list): Minimum size in polygons for patches to be
+            counted, or list of sizes. 
+        rotations (int or list): Number of rotations evenly spaced over 45
+            degrees, or list of rotation angles in degrees. 
+        retain (str): 'counts', 'labels' or 'full', as for MeshOPCR.
+    
+    Attributes:
+        opc_list (list): List of OPC at each rotation (per minimum patch size
+            if minpatch is a list). 
+        OPCR (float or list): Mean of opc_list.
+        OPCsd (float or list): Standard deviation of opc_list.
+        OPCrange (float or list): Difference between largest and smallest
+            OPC in opc_list.
+    """
+    def __init__(self, TopoMesh, minpatch, rotations=64, retain="counts"):
+        if isinstance(rotations, (list, tuple, ndarray)):
+            if len(rotations) == 0:
+                raise ValueError('OPC sweep requires at least one rotation, not an empty list of angles.')
+        elif int(rotations) < 1:
+            raise ValueError('OPC sweep requires at least one rotation, not %s.' % rotations)
+        
+        self.sweep = rotations
+        self.OPCsd = None
+        self.OPCrange = None
+        
+        MeshOPCR.__init__(self, TopoMesh, minpatch, retain)
+        
+    def calcopcr(self):
+        """Method for calculating OPC at every rotation and its mean and spread. Calls internal methods."""
+        MeshOPCR.calcopcr(self)
+        
+        opcs = array(self.opc_list, dtype=float)
+        self.OPCsd = opcs.std(axis=-1).tolist()
+        self.OPCrange = (opcs.max(axis=-1) - opcs.min(axis=-1)).tolist()
+        
+    def _get_rotations(self):
+        """Returns radians of each OPC rotation around the Z-axis."""
+        if isinstance(self.sweep, (list, tuple, ndarray)):
+            return radians(array(self.sweep, dtype=float))
+        return arange(int(self.sweep)) * math.radians(45.0/int(self.sweep))
@@ -2,54 +2,294 @@
 Created on Sep 2, 2011
 
 This module calculates relief index (3D surface area/2D area of surface
-projected on XY plane) for a provided 3D mesh using the MeshRFI class. 
+projected on XY plane) for a provided 3D mesh using the MeshRFI class.
+
+Projected area is found either exactly, as the area of the union of polygons
+projected on the XY plane, or by rasterizing projected polygons with numpy on
+a pixel grid. Both are done with scanlines over whole arrays at once. The
+original matplotlib rendering is kept as the 'plot' method, and matplotlib and
+PIL are only imported when it is used.
 
 @author: Julia M. Winchester
 '''
 
-import matplotlib
-matplotlib.use('AGG')
+from collections import Counter
+from io import BytesIO
+
+from numpy import errstate, square, amin, amax, argsort, take_along_axis, unique, searchsorted, clip, repeat, arange, concatenate, where, lexsort, nonzero, bincount, zeros, ones, ceil, floor, inf
+
+PROJECTION_METHODS = ('raster', 'exact', 'plot')
+
+# Largest number of (scanline, polygon) crossings handled at once
+SCANLINE_CHUNK = 2**21
+
+def sorted_projections(vertices, faces, axis=0):
+    """Returns XY coordinates of projected polygons with corners sorted along an axis, dropping polygons with no extent along it.
+
+    Args:
+        vertices (ndarray): Vertex XYZ points.
+        faces (ndarray): Polygons with component vertex indices.
+        axis (int): 0 to sort along X (scanlines parallel to Y), 1 to sort along Y.
+
+    Returns:
+        ndarray: Polygon corner coordinates along axis, ascending per polygon.
+        ndarray: Polygon corner coordinates along the other axis, in the same order.
+    """
+    u = vertices[:,axis][faces]
+    v = vertices[:,1-axis][faces]
+    order = argsort(u, axis=1)
+    u = take_along_axis(u, order, axis=1)
+    v = take_along_axis(v, order, axis=1)
+
+    keep = u[:,2] > u[:,0]
+    return u[keep], v[keep]
+
+def scanline_intervals(lines, u, v, ends=()):
+    """Yields intervals covered by projected polygons on scanlines, in chunks.
+
+    Only polygons strictly crossing a scanline are counted, so every crossing
+    is a proper interval between the long polygon edge and one short edge.
+
+    Args:
+        lines (ndarray): Ascending scanline positions along the sorted axis.
+        u (ndarray): Sorted polygon corner coordinates, see sorted_projections.
+        v (ndarray): Polygon corner coordinates along the other axis.
+        ends (list): Arrays of further positions, one per scanline, at which
+            the same two polygon edges are also evaluated.
+
+    Yields:
+        ndarray: Scanline index of each crossing.
+        list: (start, end) arrays of crossings on the scanlines, followed by
+            the same edges evaluated at each array of ends.
+    """
+    if len(lines) == 0:
+        return
+
+    first = searchsorted(lines, u[:,0], 'right')
+    last = searchsorted(lines, u[:,2], 'left')
+
+    # split scanlines into blocks with a bounded number of crossings
+    crossing = last > first
+    active = (bincount(first[crossing], minlength=len(lines)+1) - bincount(last[crossing], minlength=len(lines)+1)).cumsum()
+    crossings = active[:len(lines)].cumsum()
+    bounds = unique(concatenate(([0], searchsorted(crossings, arange(1, int(crossings[-1])//SCANLINE_CHUNK + 1)*SCANLINE_CHUNK), [len(lines)])))
+
+    # edges as (start, start value, slope): long edge from first to last corner,
+    # short edges from first to middle corner and from middle to last corner
+    with errstate(divide='ignore', invalid='ignore'):
+        edges = [(u[:,i], v[:,i], (v[:,j] - v[:,i])/(u[:,j] - u[:,i])) for i, j in ((0,2), (0,1), (1,2))]
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        start = clip(first, lo, hi)
+        count = clip(clip(last, lo, hi) - start, 0, None)
+        face = repeat(arange(len(u)), count)
+        if len(face) == 0:
+            continue
+        offsets = count.cumsum() - count
+        line = arange(len(face)) - repeat(offsets, count) + repeat(start, count)
+
+        upper = lines[line] >= u[face,1]
+        longedge = [array[face] for array in edges[0]]
+        shortedge = [where(upper, second[face], first[face]) for first, second in zip(edges[1], edges[2])]
+
+        intervals = list()
+        for x in [lines] + list(ends):
+            x = x[line]
+            along = longedge[1] + (x - longedge[0])*longedge[2]
+            ashort = shortedge[1] + (x - shortedge[0])*shortedge[2]
+            if not intervals:
+                lower = ashort < along
+            intervals.append((where(lower, ashort, along), where(lower, along, ashort)))
+
+        yield line, intervals
+
+def union_lengths(lines, u, v, left=None, right=None):
+    """Returns the total length covered by the union of projected polygons on each scanline.
+
+    Interval ends are sorted along each scanline and swept with a running
+    count of covering polygons. If slab bounds are given, edges that are
+    neighbours on a scanline are also compared at both bounds. Edges are
+    straight, so if no neighbours swap places, no two edges cross within the
+    slab and the union length changes linearly across it. Otherwise, the
+    points where swapping neighbours cross are returned.
+
+    Args:
+        lines (ndarray): Ascending scanline positions along the sorted axis.
+        u (ndarray): Sorted polygon corner coordinates, see sorted_projections.
+        v (ndarray): Polygon corner coordinates along the other axis.
+        left (ndarray): Lower slab bound of each scanline, optional.
+        right (ndarray): Upper slab bound of each scanline, optional.
+
+    Returns:
+        ndarray: Union length on each scanline.
+        ndarray: Scanline index of each crossing found within slabs.
+        ndarray: Position of each crossing along the sorted axis.
+    """
+    lengths = zeros(len(lines))
+    crossline = [zeros(0, int)]
+    crossat = [zeros(0)]
+    if len(u) == 0:
+        return lengths, crossline[0], crossat[0]
+
+    ends = [] if left is None else [left, right]
+    vmin = amin(v)
+    span = amax(v) - vmin + 1.0
+    tolerance = 1e-9*span
+
+    for line, intervals in scanline_intervals(lines, u, v, ends):
+        lo, hi = intervals[0]
+        points = concatenate((lo, hi))
+        owner = concatenate((line, line))
+        # offsetting each scanline past the previous one sorts by scanline, then position, in one pass
+        order = argsort(points - vmin + owner*span)
+        points, owner = points[order], owner[order]
+
+        covering = concatenate((ones(len(lo), int), -ones(len(hi), int)))[order].cumsum()
+        same = owner[1:] == owner[:-1]
+        covered = where(same & (covering[:-1] > 0), points[1:] - points[:-1], 0)
+        lengths += bincount(owner[:-1], weights=covered, minlength=len(lines))
+
+        for bound, (endlo, endhi) in zip(ends, intervals[1:]):
+            endpoints = concatenate((endlo, endhi))[order]
+            gap = points[1:] - points[:-1]
+            endgap = endpoints[1:] - endpoints[:-1]
+            crossed = nonzero(same & (endgap < -tolerance))[0]
+            if len(crossed) == 0:
+                continue
+            # the gap between neighbours closes linearly from the scanline to the bound
+            x = lines[owner[crossed]]
+            crossline.append(owner[crossed])
+            crossat.append(x + (bound[owner[crossed]] - x)*gap[crossed]/(gap[crossed] - endgap[crossed]))
+
+    return lengths, concatenate(crossline), concatenate(crossat)
+
+def projected_area_exact(vertices, faces, maxrounds=32):
+    """Returns area of the union of polygons projected on the XY plane.
+
+    Between consecutive vertex X coordinates, the same polygons cross every
+    scanline and the union length on a scanline changes linearly unless
+    projected edges cross. Slabs are split at edge crossings until no edges
+    cross within them, then measured exactly with the midpoint rule.
+
+    Args:
+        vertices (ndarray): Vertex XYZ points.
+        faces (ndarray): Polygons with component vertex indices.
+        maxrounds (int): Largest number of times slabs are split. Slabs still
+            containing crossings after this are measured with the midpoint rule.
+    """
+    u, v = sorted_projections(vertices, faces, axis=0)
+    if len(u) == 0:
+        return 0.0
+
+    events = unique(u)
+    left = events[:-1]
+    right = events[1:]
+
+    area = 0.0
+    for rounds in range(maxrounds + 1):
+        lengths, crossline, crossat = union_lengths(0.5*(left + right), u, v, left, right)
+        widths = right - left
+        linear = ones(len(left), bool)
+        linear[crossline] = False
+        if rounds == maxrounds:
+            linear[:] = True
+        area += (widths*lengths)[linear].sum()
 
-import warnings
-import matplotlib.pyplot as plt
+        if linear.all():
+            break
 
-try:
-    from StringIO import StringIO  # for Python 2
-except ImportError:
-    from io import StringIO  # for Python 3
+        # split remaining slabs at the crossings found in them
+        inside = (crossat > left[crossline]) & (crossat < right[crossline])
+        todo = nonzero(~linear)[0]
+        slab = concatenate((todo, todo, crossline[inside]))
+        cuts = concatenate((left[todo], right[todo], crossat[inside]))
+        order = lexsort((cuts, slab))
+        slab, cuts = slab[order], cuts[order]
+        piece = (slab[1:] == slab[:-1]) & (cuts[1:] > cuts[:-1])
+        left, right = cuts[:-1][piece], cuts[1:][piece]
 
-from numpy import sqrt, square, amin, amax, array, array_equal
-from numpy.linalg import det
+    return float(area)
 
-try:
-    import Image
-except ImportError:
-    from PIL import Image
+def projected_area_raster(vertices, faces, resolution=1000):
+    """Returns area of polygons projected on the XY plane, rasterized on a square pixel grid.
+
+    Pixels are counted as covered if their centers lie within a projected
+    polygon. Pixel columns are scanned at once, and covered row ranges are
+    marked in a difference array.
+
+    Args:
+        vertices (ndarray): Vertex XYZ points.
+        faces (ndarray): Polygons with component vertex indices.
+        resolution (int): Number of pixels along the longer side of the mesh
+            bounding box on the XY plane.
+
+    Returns:
+        float: Projected area.
+        int: Number of covered pixels.
+        float: Pixels per unit length.
+    """
+    xmin, ymin = amin(vertices[:,:2], axis=0)
+    xmax, ymax = amax(vertices[:,:2], axis=0)
+    pixel = max(xmax - xmin, ymax - ymin)/float(resolution)
+    if pixel == 0:
+        return 0.0, 0, inf
+
+    ncol = int(ceil((xmax - xmin)/pixel)) + 1
+    nrow = int(ceil((ymax - ymin)/pixel)) + 1
+    columns = xmin + (arange(ncol) + 0.5)*pixel
+
+    u, v = sorted_projections(vertices, faces, axis=0)
+    marks = zeros(ncol*(nrow+1))
+    for col, intervals in scanline_intervals(columns, u, v):
+        lo, hi = intervals[0]
+        first = clip(ceil((lo - ymin)/pixel - 0.5), 0, nrow).astype(int)
+        last = clip(floor((hi - ymin)/pixel - 0.5) + 1, 0, nrow).astype(int)
+        inside = last > first
+        col, first, last = col[inside], first[inside], last[inside]
+        marks += bincount(col*(nrow+1) + first, minlength=len(marks))
+        marks -= bincount(col*(nrow+1) + last, minlength=len(marks))
+
+    covered = int((marks.reshape(ncol, nrow+1).cumsum(axis=1) > 0).sum())
+    return covered*square(pixel), covered, 1.0/pixel
 
 class MeshRFI(object):
-    """Class for calculating and storing relief index values for polygonal mesh data. 
-    
+    """Class for calculating and storing relief index values for polygonal mesh data.
+
     When instanced, this class calculates relief index and associated variables
     and stores them. All attributes below are populated on instantiation.
-    
+
     Args:
-        TopoMesh (TopoMesh object): Triangulated polygon mesh data. 
-    
+        TopoMesh (TopoMesh object): Triangulated polygon mesh data.
+        method (str): Projected area method. 'raster' (numpy rasterization at the
+            given resolution, fast), 'exact' (area of union of projected polygons,
+            slower on meshes with many overhangs) or 'plot' (matplotlib rendering,
+            requires matplotlib and PIL).
+        resolution (int): Pixels along the longer side of the mesh on the XY plane
+            for the 'raster' method.
+
     Attributes:
-        Mesh (TopoMesh object): Triangulated polygon mesh data. 
+        Mesh (TopoMesh object): Triangulated polygon mesh data.
+        method (str): Projected area method.
+        resolution (int): Pixels along the longer side of the mesh for 'raster'.
         RFI (float): Mesh surface relief index (surfarea/projarea).
         surfarea (float): 3D mesh surface area.
         projarea (float): 2D mesh surface area projected on XY plane.
-        linelin (float): Reference line for building pixel/area unit ratio.
-        bluepixie (float): Number of blue pixels (mesh) on projected area render.
-        redpixie (float): Number of red pixels (reference line) on projected area render.
+        linelin (float): Reference line for building pixel/area unit ratio ('plot' only).
+        bluepixie (float): Number of blue pixels (mesh) on projected area render,
+                           or of covered pixels for the 'raster' method.
+        redpixie (float): Number of red pixels (reference line) on projected area render ('plot' only).
         pixelratio (float): Pixel/area unit ratio, used for converting number of
                             blue pixels to area units.
-        imgbuffer (StringIO object): 2D plot of surface mesh with reference line for
-                                    determining projected XY-plane surface area.
+        imgbuffer (BytesIO object): 2D plot of surface mesh with reference line for
+                                    determining projected XY-plane surface area ('plot' only).
     """
-    def __init__(self, TopoMesh): 
+    def __init__(self, TopoMesh, method="raster", resolution=1000):
+        if method not in PROJECTION_METHODS:
+            raise ValueError('Projected area method must be one of %s, not %s.' % (', '.join(PROJECTION_METHODS), method))
+
         self.Mesh = TopoMesh
+        self.method = method
+        self.resolution = resolution
         self.RFI = None
         self.surfarea = None
         self.projarea = None
@@ -58,107 +298,107 @@ class MeshRFI(object):
         self.redpixie = None
         self.pixelratio = None
         self.imgbuffer = None
-        
+
         self._check_mesh_consistency()
-        
+
         self.calcrfi()
-        
+
     def calcrfi(self):
         """Calls methods for calculating surface and projected areas, then derives relief index value."""
-        self.surfarea = round(sum(self._triangle_area(face) for face in self.Mesh.triverts),3)      
+        self.surfarea = round(self.Mesh.face_areas.sum(),3)
         self._get_projection_area()
         self.RFI = round(self.surfarea/self.projarea, 3)
-    
+
     def _get_projection_area(self):
-        """Creates 2D plot of surface mesh and derives projection area from this plot."""
-        self._plot_surface()
-        self._get_2d_area()
-    
-    def _plot_surface(self): # Returns pixel length of scalebar and image plot as StringIO file-like object
+        """Derives projection area of the mesh on the XY plane with the chosen method."""
+        if self.method == 'exact':
+            self.projarea = round(projected_area_exact(self.Mesh.vertices, self.Mesh.faces), 3)
+        elif self.method == 'raster':
+            area, self.bluepixie, self.pixelratio = projected_area_raster(self.Mesh.vertices, self.Mesh.faces, self.resolution)
+            self.projarea = round(area, 3)
+        else:
+            self._plot_surface()
+            self._get_2d_area()
+
+        if self.projarea == 0:
+            raise ValueError("Polygon mesh has a zero area projected in the XY plane.")
+
+    def _plot_surface(self): # Stores pixel length of scalebar and image plot as BytesIO file-like object
         """Plots 3D polygonal mesh as 2D raster shape on the XY plane with reference line for area units."""
+        import matplotlib
+        matplotlib.use('AGG')
+        import matplotlib.pyplot as plt
+        from matplotlib.patches import Polygon
+        from matplotlib.collections import PolyCollection
+
         xarray = self.Mesh.vertices[:,0]
         yarray = self.Mesh.vertices[:,1]
-        
+
         xaxismin = amin(xarray) - 0.5
         xaxismax = amax(xarray) + 0.5
         yaxismin = amin(yarray) - 0.5
         yaxismax = amax(yarray) + 0.5
         self.linelen = amax(yarray) - amin(yarray) + 1.0
-        
+
         if self.linelen == 1.0:
             raise ValueError("Polygon mesh has a zero area projected in the XY plane.")
-        
+
         fig = plt.figure()
         ax = fig.add_subplot(111)
-            
-        linesquare = matplotlib.patches.Polygon([[xaxismin,yaxismin],[xaxismin,yaxismax]], ec='r',fc='r')
+
+        linesquare = Polygon([[xaxismin,yaxismin],[xaxismin,yaxismax]], ec='r',fc='r')
         plt.axis([xaxismin,xaxismax,yaxismin,yaxismax])
         ax.add_patch(linesquare)
-    
+
         ax.set_xscale('linear')
         ax.set_yscale('linear')
         ax.set_aspect(1)
         ax.axis('off')
-        
-        vert = array([face[:,[0,1]] for face in self.Mesh.triverts]) # makes a copy of self.Mesh.triverts including only XY coordinate points for vertices comprising faces 
-           
-        polygons = matplotlib.collections.PolyCollection(vert,facecolor='b',edgecolor='b')
-            
+
+        vert = self.Mesh.triverts[:,:,[0,1]] # makes a copy of self.Mesh.triverts including only XY coordinate points for vertices comprising faces
+
+        polygons = PolyCollection(vert,facecolor='b',edgecolor='b')
+
         ax.add_collection(polygons)
-        
-        self.imgbuffer = StringIO()
+
+        self.imgbuffer = BytesIO()
         plt.savefig(self.imgbuffer,format='png')
-    
-    def _get_2d_area(self): # Receives image plot from StringIO object and returns absolute area covered by mesh as projected on XY plane   
+        plt.close(fig)
+
+    def _get_2d_area(self): # Receives image plot from BytesIO object and returns absolute area covered by mesh as projected on XY plane
         """Derives 2D surface area of polygonal mesh projected on XY plane given a 2D raster plot and area-unit reference line."""
-        if isinstance(self.imgbuffer, StringIO) is not True:
-            raise TypeError("Non-StringIO object provided for imgbuffer.")
-        
+        try:
+            import Image
+        except ImportError:
+            from PIL import Image
+
+        if isinstance(self.imgbuffer, BytesIO) is not True:
+            raise TypeError("Non-BytesIO object provided for imgbuffer.")
+
         self.imgbuffer.seek(0) # Rewind image buffer back to beginning to allow Image.open() to identify it
-        img = Image.open(self.imgbuffer).getdata()  
+        img = Image.open(self.imgbuffer).getdata()
+        pixels = Counter(img)
+
+        self.redpixie = self._count_pixels(pixels, (255,0,0,255), (255,127,127,255))
+        self.bluepixie = len(img) - self._count_pixels(pixels, (255, 0, 0, 255), (255, 255, 255, 255), (255, 155, 155, 255), (255, 188, 188, 255), (255, 230, 230, 255), (255, 205, 205, 255))
 
-        
-        self.redpixie = self._count_pixels(img, (255,0,0,255), (255,127,127,255))
-        self.bluepixie = len(list(img)) - self._count_pixels(img, (255, 0, 0, 255), (255, 255, 255, 255), (255, 155, 155, 255), (255, 188, 188, 255), (255, 230, 230, 255), (255, 205, 205, 255))    
-            
         rope = float(self.linelen)
-        redballoon = float(self.redpixie)   
+        redballoon = float(self.redpixie)
         self.pixelratio = redballoon/rope
-        
+
         self.projarea = round(float(self.bluepixie)*(square(rope)/square(redballoon)), 3)
 
-    def _count_pixels(self, image, *args): # Returns the number of pixels in a list of RGB+transparency values that match the colors (RGB+transparency) given in colorlist
+    def _count_pixels(self, pixels, *args): # Returns the number of pixels in a list of RGB+transparency values that match the colors (RGB+transparency) given in colorlist
         """Returns the number of pixels in an image that match colors given as *args.
-        
+
         Args:
-            image (StringIO object): Image string buffer object from which pixels are counted.
-            *args: Series of lists or tuples of RGB+transparency value color data. Pixels in 
+            pixels (Counter object): Number of pixels of each RGB+transparency color in an image.
+            *args: Series of lists or tuples of RGB+transparency value color data. Pixels in
                     image that match these colors will be counted.
         """
-        return sum([list(image).count(color) for color in set(args)])
-     
-    def _triangle_area(self, verts):
-        """Returns the area of a triangle defined by vertices.
-        
-        Args:
-            verts(ndarray): A set of three XYZ point triplets forming a triangle. 
-        """
-        fx = verts[:,0]
-        fy = verts[:,1]
-        fz = verts[:,2]
-        fc = [1,1,1]
-        
-        a = [fx, fy, fc]
-        b = [fy, fz, fc]
-        c = [fz, fx, fc]
-        
-        return 0.5*sqrt(square(det(a))+square(det(b))+square(det(c)))
-    
-    def _check_mesh_consistency(self):
-        """Checks mesh vertex and face-vertex arrays to ensure identical vertices throughout."""
-        for i, trivert in enumerate(self.Mesh.triverts):
-            if (trivert != self.Mesh.vertices[self.Mesh.faces[i]]).any():
-                raise ValueError("Mesh vertex and face arrays do not contain identical vertices.")
-
-
+        return sum(pixels[tuple(color)] for color in set(args))
 
+    def _check_mesh_consistency(self):
+        """Checks mesh vertex and face arrays for consistency unless the current arrays have already been checked."""
+        if self.Mesh.meshcheck is None or not self.Mesh.meshcheck.matches(self.Mesh):
+            self.Mesh.check_mesh_consistency()
@@ -0,0 +1,180 @@
+'''
+Created on Oct 18, 2026
+
+This module runs a per-mesh function over many mesh files with one pool of
+worker processes, instead of starting a new Python process for every mesh.
+Meshes are handed to workers in chunks, each mesh can be given a time limit,
+failed meshes are retried, and meshes already listed in an output table can
+be skipped so that interrupted batches resume where they stopped.
+
+Every worker has its own pipe and reports each mesh it starts, so the parent
+always knows which mesh a worker is on. A worker that exceeds the time limit
+is killed, even within compiled code, and a worker that dies (segmentation
+fault, out of memory kill) is replaced. Either way only the mesh it was on
+fails, and the rest of its chunk is handed out again.
+'''
+
+import os
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+def _worker(connection, function):
+    """Runs function on chunks of mesh paths received from the parent until sent None, sending ('start', path) before and ('done', path, result, error) after each mesh."""
+    for chunk in iter(connection.recv, None):
+        for path in chunk:
+            connection.send(('start', path))
+            try:
+                outcome = ('done', path, function(path), None)
+            except Exception as err:
+                outcome = ('done', path, None, '%s: %s' % (type(err).__name__, err))
+            connection.send(outcome)
+
+class _Worker(object):
+    """Worker process with its own pipe, tracking the meshes it has been sent.
+
+    Attributes:
+        connection (Connection): Parent end of the pipe to the worker.
+        process (Process): Worker process.
+        queued (deque): Paths sent to the worker and not finished, in order.
+        current (str): Path of the mesh the worker is calculating (first in
+            queued), or None.
+        started (float): time.monotonic() when the current mesh was started.
+    """
+    def __init__(self, function):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=_worker, args=(child, function), daemon=True)
+        self.process.start()
+        child.close()
+        self.queued = deque()
+        self.current = None
+        self.started = None
+
+    def send(self, chunk):
+        """Sends a chunk of paths to the worker. Returns False if the worker can no longer receive them."""
+        try:
+            self.connection.send(chunk)
+        except OSError:
+            return False
+        self.queued.extend(chunk)
+        return True
+
+    def overdue(self, timeout, now):
+        """Returns seconds until the current mesh exceeds timeout (negative once exceeded), or None if there is no limit to wait for."""
+        if not timeout or self.current is None:
+            return None
+        return self.started + timeout - now
+
+    def close(self):
+        """Stops the worker process and closes its pipe."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+def mesh_files(directory, extensions=('.ply', '.off')):
+    """Returns sorted paths of mesh files in a directory."""
+    return [os.path.join(directory, filename) for filename in sorted(os.listdir(directory)) if filename.endswith(extensions)]
+
+def finished_names(table, column=0, delimiter=','):
+    """Returns the set of names in one column of an existing output table, skipping its header. Returns an empty set if there is no table."""
+    if not os.path.isfile(table):
+        return set()
+    with open(table, 'r') as tablefile:
+        next(tablefile, None)
+        return set(line.rstrip('\n').split(delimiter)[column] for line in tablefile if line.strip())
+
+def default_chunksize(ntask, workers):
+    """Returns a chunk size giving each worker about 16 chunks, so that chunks amortize process communication but still balance load."""
+    return max(1, min(64, ntask // (16*workers)))
+
+def _run_round(function, paths, workers, chunksize, timeout):
+    """Runs function once on every path with a pool of worker processes, yielding (path, result, error) as meshes finish, fail, time out or crash their worker."""
+    pending = deque(paths[i:i + chunksize] for i in range(0, len(paths), chunksize))
+    pool = [_Worker(function) for _ in range(min(workers, len(pending)))]
+
+    try:
+        while pending or any(worker.queued for worker in pool):
+            for worker in pool:
+                if not worker.queued and pending:
+                    chunk = pending.popleft()
+                    if not worker.send(chunk):
+                        pending.appendleft(chunk) # worker has died, it is replaced below
+
+            now = time.monotonic()
+            limits = [left for left in (worker.overdue(timeout, now) for worker in pool) if left is not None]
+            ready = wait([worker.connection for worker in pool], max(0, min(limits)) if limits else None)
+
+            for i, worker in enumerate(pool):
+                if worker.connection in ready:
+                    try:
+                        message = worker.connection.recv()
+                    except (EOFError, OSError):
+                        worker.process.join()
+                        error = 'WorkerDied: worker process exited with code %s.' % worker.process.exitcode
+                    else:
+                        if message[0] == 'start':
+                            worker.current, worker.started = message[1], time.monotonic()
+                        else:
+                            worker.queued.popleft()
+                            worker.current = None
+                            yield message[1:]
+                        continue
+                else:
+                    left = worker.overdue(timeout, time.monotonic())
+                    if left is None or left > 0:
+                        continue
+                    error = 'MeshTimeout: mesh calculation exceeded time limit of %s seconds.' % timeout
+
+                # the mesh the worker was on (queued first) fails, the rest of its chunk is handed out again
+                worker.close()
+                pool[i] = _Worker(function)
+                if worker.queued:
+                    path = worker.queued.popleft()
+                    if worker.queued:
+                        pending.appendleft(list(worker.queued))
+                    yield path, None, error
+    finally:
+        for worker in pool:
+            worker.close()
+
+def run_batch(function, paths, workers=None, chunksize=None, timeout=None, retries=1):
+    """Runs a function on every mesh path with a pool of worker processes, yielding results as meshes finish.
+
+    Args:
+        function (callable): Picklable function (module level, or a
+            functools.partial of one) taking a mesh path. Exceptions it raises
+            are caught and reported as errors.
+        paths (list): Mesh file paths.
+        workers (int): Number of worker processes, all CPUs if None.
+        chunksize (int): Number of meshes sent to a worker at once, see
+            default_chunksize if None. Retries are sent one mesh at a time.
+        timeout (float): Time limit in seconds for one mesh, none if None or 0.
+            A worker over the limit is killed and replaced.
+        retries (int): Number of times a failed mesh is run again. Meshes fail
+            by raising an exception, exceeding the time limit or ending their
+            worker process.
+
+    Yields:
+        tuple: Mesh path, function result (None on failure) and error message
+            (None on success) of each mesh, in order of completion.
+    """
+    workers = workers or os.cpu_count() or 1
+    todo = list(paths)
+
+    for attempt in range(retries + 1):
+        if not todo:
+            break
+        size = (chunksize or default_chunksize(len(todo), workers)) if attempt == 0 else 1
+        failed = list()
+
+        for path, result, error in _run_round(function, todo, workers, size, timeout):
+            if error is None:
+                yield path, result, None
+            elif attempt == retries:
+                yield path, None, error
+            else:
+                failed.append(path)
+
+        todo = failed
@@ -0,0 +1,68 @@
+#This script guards cold-start time of the OPC-only path used by 1opc.py and run_opc.py, which start one Python process per tooth. Each run starts a fresh interpreter with -X importtime, loads a mesh and computes OPC, then reports the cumulative import time of topomesh and OPC and the slowest imports. The check fails if a module only needed by other metrics (DNE, RFI, smoothing, scipy.stats, matplotlib, PIL) is imported, or if the median import time exceeds an optional budget in milliseconds.
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from bench_read_ply import write_grid_ply
+
+# Modules the OPC-only path must not import
+FORBIDDEN = ("DNE", "RFI", "implicitfair", "scipy.stats", "matplotlib", "PIL")
+
+OPC_PATH = "from topomesh import TopoMesh; mesh = TopoMesh(%r); mesh.GenerateOPCR(3, retain='counts')"
+
+# Function to run the OPC path once in a fresh interpreter and parse -X importtime output
+def cold_start(file_path):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", OPC_PATH % file_path],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        selftime, cumulative, name = line[len("import time:"):].split("|")
+        imports[name.strip()] = (int(selftime), int(cumulative))
+    return imports
+
+# Function to time repeated cold starts and check which modules the OPC path imports
+def benchmark(file_path, repeat=5, budget=None):
+    runs = [cold_start(file_path) for _ in range(repeat)]
+    imports = runs[-1]
+
+    totals = [sum(run[name][1] for name in ("topomesh", "OPC") if name in run)/1000.0 for run in runs]
+    median = statistics.median(totals)
+
+    print("SLOWEST IMPORTS (CUMULATIVE MS, LAST RUN)")
+    for name, (_, cumulative) in sorted(imports.items(), key=lambda item: -item[1][1])[:10]:
+        print(f"{name}\t{cumulative/1000.0:.1f}")
+    print(f"\nTOPOMESH + OPC IMPORT MS\tmedian {median:.1f}\tmin {min(totals):.1f}\tmax {max(totals):.1f}")
+
+    failed = False
+    found = [name for name in imports if name.split(".")[0] in FORBIDDEN or name in FORBIDDEN]
+    if found:
+        print("FAIL: OPC path imports " + ", ".join(sorted(found)))
+        failed = True
+    if budget is not None and median > budget:
+        print(f"FAIL: median import time {median:.1f} ms exceeds budget of {budget:.1f} ms")
+        failed = True
+    return not failed
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        print("Usage: python bench_import_opc.py [budget_ms] [mesh.ply]")
+        sys.exit(1)
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    if len(sys.argv) > 2:
+        passed = benchmark(os.path.abspath(sys.argv[2]), budget=budget)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "grid.ply")
+            write_grid_ply(file_path, n=60)
+            passed = benchmark(file_path, budget=budget)
+
+    sys.exit(0 if passed else 1)
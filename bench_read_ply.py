@@ -0,0 +1,81 @@
+#This script times parsing of ASCII .ply files with PlythonMesh against the original line-by-line reader. If no .ply files are given, a synthetic tooth-sized grid mesh is written to a temporary file and used instead. Both readers must return identical arrays (face-vertex points are gathered from the new reader output for comparison).
+
+import os
+import sys
+import tempfile
+import timeit
+import numpy as np
+from plython import PlythonMesh
+
+# Original per-line ASCII reader, kept here as the reference for timing and output comparison
+def legacy_read_ascii(mesh, meshstring):
+    meshdata = meshstring[meshstring.find('end_header'):].splitlines()[1:]
+
+    if len(meshdata) < mesh.nvert:
+        raise EOFError('Unexpected end of .PLY file in list of vertices.')
+
+    vlist = meshdata[0:mesh.nvert]
+
+    if len(meshdata[mesh.nvert:]) < mesh.nface:
+        raise EOFError('Unexpected end of .PLY in list of polygon vertex indices.')
+
+    flist = meshdata[mesh.nvert:(mesh.nvert+mesh.nface)]
+
+    if flist[0][0] != '3':
+        raise ValueError('Non-triangular polygons found within .PLY file.')
+
+    varray = np.array([vertices.split() for vertices in vlist], float)
+    farray = np.array([vertices.split()[1:4] for vertices in flist], int)
+    vfarray = np.array([[varray[vindex] for vindex in vertices] for vertices in farray], float)
+
+    return varray, farray, vfarray
+
+# Function to write a synthetic grid mesh of roughly 2*n*n faces to an ASCII .ply file
+def write_grid_ply(file_path, n=120):
+    xs, ys = np.meshgrid(np.linspace(-3, 3, n), np.linspace(-2, 2, n))
+    zs = np.exp(-(xs**2 + ys**2)) + 0.1*np.sin(3*xs)
+    vertices = np.column_stack([xs.ravel(), ys.ravel(), zs.ravel()])
+
+    grid = np.arange(n*n).reshape(n, n)
+    a, b, c, d = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel(), grid[1:, 1:].ravel(), grid[1:, :-1].ravel()
+    faces = np.vstack([np.column_stack([a, b, c]), np.column_stack([a, c, d])])
+
+    with open(file_path, 'w') as file:
+        file.write("ply\nformat ascii 1.0\nelement vertex %d\n" % len(vertices))
+        file.write("property float x\nproperty float y\nproperty float z\nelement face %d\nproperty list uchar int vertex_indices\nend_header\n" % len(faces))
+        for xyz in vertices.tolist():
+            file.write("%r %r %r\n" % tuple(xyz))
+        for face in faces.tolist():
+            file.write("3 %d %d %d\n" % tuple(face))
+
+# Function to time both readers on one file and check that they agree
+def benchmark(file_path, repeat=5):
+    with open(file_path, 'r') as file:
+        meshstring = file.read()
+
+    mesh = PlythonMesh()
+    mesh.nvert = int(mesh._StringAfter(meshstring, 'element vertex'))
+    mesh.nface = int(mesh._StringAfter(meshstring, 'element face'))
+
+    legacy = legacy_read_ascii(mesh, meshstring)
+    varray, farray = mesh._read_ascii(meshstring)
+    for old, new in zip(legacy, (varray, farray, varray[farray])):
+        if old.shape != new.shape or (old != new).any():
+            raise ValueError(f"Readers disagree on {file_path}")
+
+    legacy_time = min(timeit.repeat(lambda: legacy_read_ascii(mesh, meshstring), number=1, repeat=repeat))
+    current_time = min(timeit.repeat(lambda: mesh._read_ascii(meshstring), number=1, repeat=repeat))
+
+    print(f"{os.path.basename(file_path)}\t{mesh.nvert}\t{mesh.nface}\t{legacy_time*1000:.1f}\t{current_time*1000:.1f}\t{legacy_time/current_time:.1f}x")
+
+if __name__ == "__main__":
+    print("FILE\tVERTICES\tFACES\tLEGACY MS\tCURRENT MS\tSPEEDUP")
+
+    if len(sys.argv) > 1:
+        for file_path in sys.argv[1:]:
+            benchmark(file_path)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = os.path.join(tmpdir, "grid.ply")
+            write_grid_ply(file_path)
+            benchmark(file_path)
@@ -1,29 +1,37 @@
 import os
+
+# One BLAS thread per worker process, so that workers do not compete for cores
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
 import sys
-import warnings
+import argparse
+import functools
 from topomesh import TopoMesh
+import batch
 
-def calculate_opc(input_path, output_path, min_patch_size):
-    try:
-        # Load the .ply file
-        mesh = TopoMesh(input_path)
-        # Calculate OPC
-        mesh.GenerateOPCR(min_patch_size)
-        # Save the OPC result to the output path
-        with open(output_path, 'w') as f:
-            f.write(str(mesh.OPCR))
-        print(f"OPC calculation completed. Result saved to {output_path}")
-    except Exception as e:
-        print(f"Error: {e}")
+# Function to calculate OPC of one mesh for all minimum patch sizes at once
+def mesh_opc(input_path, min_patch_sizes):
+    mesh = TopoMesh(input_path)
+    mesh.GenerateOPCR(min_patch_sizes, retain="counts")
+    return mesh.OPCR
 
 if __name__ == "__main__":
-    if len(sys.argv) != 4:
-        print("Usage: python script.py input_dir output_dir min_patch_size")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Calculate OPC of every .ply and .off file in a directory with a pool of worker processes. Results are appended to opc_table.csv in the output directory as meshes finish, and meshes already in the table are skipped.")
+    parser.add_argument("input_dir", help="Directory containing .ply and .off files")
+    parser.add_argument("output_dir", help="Directory for opc_table.csv and opc_errors.txt")
+    parser.add_argument("min_patch_sizes", help="Minimum patch size, or comma separated list of sizes (e.g. 2,3,5,10)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Meshes sent to a worker at once (default: about 16 chunks per worker)")
+    parser.add_argument("--timeout", type=float, default=300, help="Time limit in seconds for one mesh, 0 for none (default: 300)")
+    parser.add_argument("--retries", type=int, default=1, help="Number of times a failed mesh is run again (default: 1)")
+    parser.add_argument("--restart", action="store_true", help="Start a new opc_table.csv instead of resuming the existing one")
+    parser.add_argument("--txt", action="store_true", help="Also write one _opc.txt file per mesh, as 1opc.py does")
+    args = parser.parse_args()
 
-    input_dir = sys.argv[1]
-    output_dir = sys.argv[2]
-    min_patch_size = int(sys.argv[3])
+    input_dir = args.input_dir
+    output_dir = args.output_dir
+    min_patch_sizes = [int(size) for size in args.min_patch_sizes.split(',')]
 
     # Check if the input directory exists
     if not os.path.isdir(input_dir):
@@ -34,10 +42,44 @@ if __name__ == "__main__":
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    # Iterate over all .ply files in the input directory
-    for filename in os.listdir(input_dir):
-        if filename.endswith('.ply'):
-            input_path = os.path.join(input_dir, filename)
-            output_filename = os.path.splitext(filename)[0] + '_opc.txt'
-            output_path = os.path.join(output_dir, output_filename)
-            calculate_opc(input_path, output_path, min_patch_size)
+    # Table of OPC values with one column per minimum patch size, resumed if it already exists
+    table_path = os.path.join(output_dir, "opc_table.csv")
+    header = "Filename," + ",".join(f"OPC min {size}" for size in min_patch_sizes) + "\n"
+
+    finished = set()
+    if os.path.isfile(table_path) and os.path.getsize(table_path) > 0 and not args.restart:
+        with open(table_path, 'r') as table:
+            if table.readline() != header:
+                print(f"Error: '{table_path}' was made with different minimum patch sizes. Use --restart to replace it.")
+                sys.exit(1)
+        finished = batch.finished_names(table_path)
+
+    paths = [path for path in batch.mesh_files(input_dir) if os.path.basename(path) not in finished]
+    print(f"{len(paths)} meshes to process, {len(finished)} already in {table_path}")
+
+    table = open(table_path, 'w' if args.restart else 'a')
+    if table.tell() == 0:
+        table.write(header)
+    errors = open(os.path.join(output_dir, "opc_errors.txt"), 'a')
+
+    done = 0
+    failed = 0
+    function = functools.partial(mesh_opc, min_patch_sizes=min_patch_sizes)
+    for path, opcr, error in batch.run_batch(function, paths, args.workers, args.chunksize, args.timeout, args.retries):
+        filename = os.path.basename(path)
+        if error is not None:
+            failed += 1
+            errors.write(f"{filename}\t{error}\n")
+            errors.flush()
+            continue
+
+        done += 1
+        table.write(filename + "," + ",".join(str(value) for value in opcr) + "\n")
+        table.flush()
+        if args.txt:
+            with open(os.path.join(output_dir, os.path.splitext(filename)[0] + '_opc.txt'), 'w') as f:
+                f.write(",".join(str(value) for value in opcr))
+
+    table.close()
+    errors.close()
+    print(f"Finished. {done} meshes calculated, {failed} failed (see opc_errors.txt). Results stored in {table_path}")
@@ -2,67 +2,66 @@
 
 import os
 import glob
+from plython import read_off
 
-# Function to check the height of the generated .off file
-def check_height(off_file):
-    if not os.path.isfile(off_file):
-        raise ValueError(f"OFF file does not exist: {off_file}")
-    
-    print(f"Checking height for file: {off_file}")
-    
-    # Read the .off file
-    with open(off_file, 'r') as file:
-        lines = file.readlines()
-    
-    # Check if the file is in OFF or COFF format
-    if lines[0].strip() not in ['OFF', 'COFF']:
-        raise ValueError(f"File {off_file} is not in OFF or COFF format.")
-    
-    # Read the number of vertices and faces
-    num_vertices, num_faces, _ = map(int, lines[1].strip().split())
-    
-    # Read the vertices
-    z_values = [float(lines[i].strip().split()[2]) for i in range(2, 2 + num_vertices)]
+# Teeth lower than this (in Z) are too flat
+HEIGHT_THRESHOLD = 0.5
+
+# Function to check the height of a tooth from its vertices
+def tooth_height(vertices):
+    z_values = vertices[:, 2]
     
     # Calculate the height (z-coordinate range)
     height = max(z_values) - min(z_values)
     
-    if height < 0.5:
+    if height < HEIGHT_THRESHOLD:
         return False, height
     else:
         return True, height
 
-# List all .off files in the current directory
-off_files = glob.glob("*.off")
+# Function to check the height of the generated .off file
+def check_height(off_file):
+    if not os.path.isfile(off_file):
+        raise ValueError(f"OFF file does not exist: {off_file}")
+    
+    print(f"Checking height for file: {off_file}")
+    
+    # Read the .off file (raises ValueError if it is not in OFF or COFF format)
+    vertices, faces = read_off(off_file)
+    return tooth_height(vertices)
+
+if __name__ == "__main__":
+    # List all .off files in the current directory
+    off_files = glob.glob("*.off")
 
-# Check if there are any .off files to process
-if not off_files:
-    print("No .off files found in the current directory.")
-    exit()
+    # Check if there are any .off files to process
+    if not off_files:
+        print("No .off files found in the current directory.")
+        exit()
 
-# Open the output files for writing
-tall_enough_file = open("18985_tall_enough.txt", "w")
-too_flat_file = open("18985_too_flat.txt", "w")
+    # Open the output files for writing
+    tall_enough_file = open("18985_tall_enough.txt", "w")
+    too_flat_file = open("18985_too_flat.txt", "w")
 
-# Process each .off file
-for off_file in off_files:
-    try:
-        # Check the height of the current .off file
-        height_ok, height_value = check_height(off_file)
+    # Process each .off file
+    for off_file in off_files:
+        try:
+            # Check the height of the current .off file
+            height_ok, height_value = check_height(off_file)
         
-        if height_ok:
-            # File is tall enough
-            print(f"{off_file} is tall enough with height {height_value}")
-            tall_enough_file.write(f"{off_file} {height_value}\n")
-        else:
-            # File is too flat
-            print(f"{off_file} is too flat with height {height_value}")
-            too_flat_file.write(f"{off_file} {height_value}\n")
-    except Exception as e:
-        print(f"Error processing {off_file}: {e}")
+            if height_ok:
+                # File is tall enough
+                print(f"{off_file} is tall enough with height {height_value}")
+                tall_enough_file.write(f"{off_file} {height_value}\n")
+            else:
+                # File is too flat
+                print(f"{off_file} is too flat with height {height_value}")
+                too_flat_file.write(f"{off_file} {height_value}\n")
+        except Exception as e:
+            print(f"Error processing {off_file}: {e}")
 
-# Close the output files
-tall_enough_file.close()
-too_flat_file.close()
+    # Close the output files
+    tall_enough_file.close()
+    too_flat_file.close()
 
-print("Height checking completed.")
+    print("Height checking completed.")
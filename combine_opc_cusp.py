@@ -6,6 +6,7 @@ import argparse
 parser = argparse.ArgumentParser(description="Combine OPC and cusp data into a single file.")
 parser.add_argument("opc_file", help="Path to the OPC file")
 parser.add_argument("cusp_file", help="Path to the cusp file")
+parser.add_argument("--size", type=int, default=None, help="Minimum patch size of the OPC column to use, if the OPC file has one column per size (e.g. opc_table.csv from calc_opc.py with several sizes)")
 args = parser.parse_args()
 
 # Paths to input files
@@ -23,12 +24,25 @@ def extract_tooth_name(filename):
         return match.group(1)
     return None
 
+# Function to find the OPC column in the header line, by minimum patch size if there is more than one
+def opc_column(header, size):
+    columns = header.strip().split(',')
+    if size is None:
+        if len(columns) != 2:
+            raise SystemExit(f"Error: {opc_file_path} has OPC columns {', '.join(columns[1:])}. Choose one with --size.")
+        return 1
+    name = f"OPC min {size}"
+    if name not in columns:
+        raise SystemExit(f"Error: {opc_file_path} has no '{name}' column.")
+    return columns.index(name)
+
 # Read OPC file and create a dictionary
 opc_dict = {}
 with open(opc_file_path, 'r') as opc_file:
-    next(opc_file)  # Skip header line
+    column = opc_column(next(opc_file), args.size)  # Header line
     for line in opc_file:
-        filename, opc_value = line.strip().split(',')
+        values = line.strip().split(',')
+        filename, opc_value = values[0], values[column]
         tooth_name = extract_tooth_name(filename)
         if tooth_name:
             opc_dict[tooth_name] = opc_value
@@ -2,75 +2,71 @@ import os
 import sys
 import numpy as np
 import math
-from collections import defaultdict
+from plython import read_off
 
-# Function to read .off file and extract vertices and faces
+# Function to read .off file and extract vertices and faces (polygons as written, not split into triangles)
 def read_off_file(file_path):
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
-
-    if lines[0].strip() not in ['OFF', 'COFF']:
-        raise ValueError("The file is not in OFF or COFF format.")
-
-    header = lines[1].strip().split()
-    num_vertices = int(header[0])
-    num_faces = int(header[1])
-
-    vertices = []
-    for i in range(2, 2 + num_vertices):
-        vertex_data = list(map(float, lines[i].strip().split()))
-        vertices.append([round(coord, 6) for coord in vertex_data[:3]])  # Round to 6 decimal places
-
-    faces = []
-    for i in range(2 + num_vertices, 2 + num_faces):
-        faces.append(list(map(int, lines[i].strip().split()[1:])))
-
-    return vertices, faces
+    vertices, _, polygons = read_off(file_path, polygons=True)
+    vertices = np.round(vertices, 6)  # Round to 6 decimal places
+    return vertices.tolist(), polygons
+
+# Function to find the neighbors of every vertex along polygon edges, as CSR pointer and index arrays
+def polygon_neighbors(faces, num_vertices):
+    if isinstance(faces, np.ndarray) and faces.ndim != 2:
+        raise ValueError(f"Faces must be a 2-D array or a list of polygons, not an array of shape {faces.shape}.")
+    try:
+        sizes = np.array([len(face) for face in faces], dtype=int)
+    except TypeError:
+        raise ValueError("Faces must be a list of polygons, each a list of vertex indices.")
+    corners = np.array([index for face in faces for index in face], dtype=int)
+
+    if (sizes < 3).any():
+        raise ValueError("Polygons must have at least three vertices.")
+    if len(corners) > 0 and (corners.min() < 0 or corners.max() >= num_vertices):
+        raise ValueError(f"Polygon vertex indices must be between 0 and {num_vertices - 1}.")
+
+    # Each corner is joined to the next corner of its polygon, the last corner to the first
+    ends = np.cumsum(sizes)
+    following = np.arange(len(corners)) + 1
+    following[ends - 1] = ends - sizes
+    first, second = corners, corners[following]
+
+    # Both directions of every edge, once each
+    pairs = np.unique(np.concatenate((first*num_vertices + second, second*num_vertices + first)))
+    neighbor_count = np.bincount(pairs // num_vertices, minlength=num_vertices)
+    return np.concatenate(([0], np.cumsum(neighbor_count))), pairs % num_vertices
 
 # Function to find cusps (local maxima)
-def find_cusps(vertices, faces):
-    vertex_heights = [-v[2] for v in vertices]  # Using negative z-coordinate as height
-    adjacency_list = defaultdict(set)
+def find_cusps(vertices, faces, topology=None):
+    vertices = np.asarray(vertices, dtype=float)
+    if topology is None:
+        neighbor_ptr, neighbor_idx = polygon_neighbors(faces, len(vertices))
+    else:
+        # Topology of a triangle mesh, whose faces are its polygons, holds the same edges
+        neighbor_ptr, neighbor_idx = topology.vert_vert_ptr, topology.vert_vert_idx
+    vertex_heights = -vertices[:, 2]  # Using negative z-coordinate as height
+
+    # One entry per (vertex, neighbor) pair along polygon edges
+    neighbor_count = np.diff(neighbor_ptr)
+    vertex_index = np.repeat(np.arange(len(vertices)), neighbor_count)
+    height_difference = vertex_heights[neighbor_idx] - vertex_heights[vertex_index]
 
-    for face in faces:
-        for i in range(len(face)):
-            adjacency_list[face[i]].add(face[(i + 1) % len(face)])
-            adjacency_list[face[i]].add(face[(i - 1) % len(face)])
-
-    cusps = []
     epsilon = 0.0001
 
-    # Find the leftmost and rightmost x coordinates
-    x_coords = [v[0] for v in vertices]
-    leftmost_x = min(x_coords)
-    rightmost_x = max(x_coords)
+    # A vertex is a local maximum if no neighbor is higher by epsilon or more
+    higher_neighbors = np.bincount(vertex_index, weights=height_difference >= epsilon, minlength=len(vertices))
+    is_maxima = higher_neighbors == 0
 
-    for i, height in enumerate(vertex_heights):
-        # Skip the leftmost and rightmost points
-        if vertices[i][0] == leftmost_x or vertices[i][0] == rightmost_x:
-            continue
+    # Skip the leftmost and rightmost points
+    x_coords = vertices[:, 0]
+    is_maxima &= (x_coords != x_coords.min()) & (x_coords != x_coords.max())
 
-        is_maxima = True
-        for neighbor in adjacency_list[i]:
-            if abs(vertex_heights[neighbor] - height) < epsilon:
-                continue
-            elif vertex_heights[neighbor] > height:
-                is_maxima = False
-                break
+    # Check if the maximum z-distance between neighboring vertices is greater than 0.5
+    max_z_distance = np.zeros(len(vertices))
+    np.maximum.at(max_z_distance, vertex_index, np.abs(height_difference))
 
-        if is_maxima and len(adjacency_list[i]) > 2:
-            # Check if the maximum z-distance between neighboring vertices is greater than 0.5
-            neighbor_indices = adjacency_list[i]
-            max_z_distance = 0
-            for neighbor_index in neighbor_indices:
-                neighbor = vertices[neighbor_index]
-                z_distance = abs(height - (-neighbor[2]))
-                if z_distance > max_z_distance:
-                    max_z_distance = z_distance
-            if max_z_distance > 0.5:
-                cusps.append(vertices[i])
-
-    return cusps
+    cusp_indices = np.nonzero(is_maxima & (neighbor_count > 2) & (max_z_distance > 0.5))[0]
+    return vertices[cusp_indices].tolist()
 
 # Function to read local maxima from file
 def read_local_maxima(infile):
@@ -176,6 +172,38 @@ def determine_real_cusps(cusps, threshold=0.1):
 
     return len(real_cusps)
 
+# Function to compute the cusp angle, number of real cusps and inhibitory cascade test of one tooth
+def cusp_metrics(vertices, faces, topology=None):
+    cusps = find_cusps(vertices, faces, topology)
+
+    local_maxima = cusps
+
+    cuspA, cusps = get_individual_cusps(local_maxima)
+
+    # Check if all other cusps have a higher Z value than cusp A
+    passes_inhibitory_cascade = True
+    tolerance = 0.1
+    if len(cusps) > 1:
+        for i in range(len(cusps)):
+            if i != cuspA and cusps[i][2] < cusps[cuspA][2] - tolerance:
+                print(f"Fails Inhibitory Cascade: cusp {i} with Z value {cusps[i][2]} is lower than cuspA")
+                passes_inhibitory_cascade = False
+                break
+
+    # Compute angle
+    angle, degrees = get_angle(cuspA, cusps)
+    if angle is None:
+        angle_radians = ""
+        angle_degrees = ""
+    else:
+        angle_radians = angle
+        angle_degrees = degrees
+
+    # Determine the number of real cusps
+    num_real_cusps = determine_real_cusps(local_maxima)
+
+    return angle_radians, angle_degrees, num_real_cusps, passes_inhibitory_cascade
+
 # Main function to process the .off files in a directory and generate the output file
 def process_off_files(directory):
     # Create a subdirectory for results
@@ -198,34 +226,9 @@ def process_off_files(directory):
             print(filename)
             file_path = os.path.join(directory, filename)
             vertices, faces = read_off_file(file_path)
-            cusps = find_cusps(vertices, faces)
-
-            local_maxima = cusps
-
-            cuspA, cusps = get_individual_cusps(local_maxima)
-
-            # Check if all other cusps have a higher Z value than cusp A
-            passes_inhibitory_cascade = True
-            tolerance = 0.1
-            if len(cusps) > 1:
-                for i in range(len(cusps)):
-                    if i != cuspA and cusps[i][2] < cusps[cuspA][2] - tolerance:
-                        print(f"Fails Inhibitory Cascade: cusp {i} with Z value {cusps[i][2]} is lower than cuspA")
-                        passes_inhibitory_cascade = False
-                        break
-
-            # Compute angle
-            angle, degrees = get_angle(cuspA, cusps)
-            if angle is None:
-                print(f"No angle calculated for file {filename}, cuspA {cuspA}")
-                angle_radians = ""
-                angle_degrees = ""
-            else:
-                angle_radians = angle
-                angle_degrees = degrees
-
-            # Determine the number of real cusps
-            num_real_cusps = determine_real_cusps(local_maxima)
+            angle_radians, angle_degrees, num_real_cusps, passes_inhibitory_cascade = cusp_metrics(vertices, faces)
+            if angle_radians == "":
+                print(f"No angle calculated for file {filename}")
 
             # Determine the tooth ID
             base_name = os.path.splitext(filename)[0]
@@ -1,26 +1,38 @@
 import os
 import sys
 
-def extract_opc_values(input_dir, output_file):
+# Function to collect the OPC values of _opc.txt files into one table. Files written for several minimum
+# patch sizes hold one comma separated value per size, which become columns named as in opc_table.csv.
+def extract_opc_values(input_dir, output_file, min_patch_sizes=None):
     try:
+        if min_patch_sizes is None or len(min_patch_sizes) == 1:
+            header = "Filename,OPC Value\n"
+        else:
+            header = "Filename," + ",".join(f"OPC min {size}" for size in min_patch_sizes) + "\n"
+        ncolumn = 1 if min_patch_sizes is None else len(min_patch_sizes)
+
         with open(output_file, 'w') as outfile:
-            outfile.write("Filename,OPC Value\n")
+            outfile.write(header)
             for filename in os.listdir(input_dir):
-                if filename.endswith('.txt'):
+                # per tooth files of 1opc.py, not the combined table combine_opc_cusp.py writes next to them
+                if filename.endswith('_opc.txt') and filename != 'cusp_opc.txt':
                     file_path = os.path.join(input_dir, filename)
                     with open(file_path, 'r') as infile:
                         opc_value = infile.read().strip()
-                        outfile.write(f"{filename},{opc_value}\n")
+                    if len(opc_value.split(',')) != ncolumn:
+                        raise ValueError(f"{filename} holds {len(opc_value.split(','))} OPC values, expected {ncolumn}. Give the minimum patch sizes it was calculated with.")
+                    outfile.write(f"{filename},{opc_value}\n")
         print(f"OPC values extracted and saved to {output_file}")
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python script.py input_dir")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python script.py input_dir [min_patch_size,min_patch_size,...]")
         sys.exit(1)
 
     input_dir = sys.argv[1]
+    min_patch_sizes = [int(size) for size in sys.argv[2].split(',')] if len(sys.argv) == 3 else None
 
     # Check if the input directory exists
     if not os.path.isdir(input_dir):
@@ -31,4 +43,4 @@ if __name__ == "__main__":
     output_file = os.path.join(input_dir, 'opc_list.txt')
 
     # Extract OPC values and write to the output file
-    extract_opc_values(input_dir, output_file)
+    extract_opc_values(input_dir, output_file, min_patch_sizes)
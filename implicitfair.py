@@ -6,94 +6,171 @@ Contains functions for executing an implicit fairing smooth on a 3D mesh.
 @author: Julia M. Winchester
 '''
 
-from math import acos, tan
-from numpy import sqrt, spacing, diag, mat 
-from numpy.linalg import cholesky, solve, LinAlgError
-from scipy.sparse import identity, lil_matrix
+from collections import OrderedDict
+from hashlib import sha1
+from numpy import sqrt, spacing, maximum, clip, arccos, tan, where, concatenate, asarray, ascontiguousarray, errstate
+from scipy.sparse import identity, coo_matrix, diags
+from scipy.sparse.linalg import splu
 
-def clamp(n, minn, maxn):
-    return max(min(maxn, n), minn)
+try:
+    from sksparse.cholmod import cholesky as sparsecholesky, CholmodNotPositiveDefiniteError
+except ImportError:
+    sparsecholesky = None
 
 def My_Angle(u,v):
-    du = sqrt(sum(u**2))
-    dv = sqrt(sum(v**2))
-    du = max(du,spacing(1))
-    dv = max(dv,spacing(1))
-
-    x = sum(u*v) / (du*dv)
-    x = clamp(x, -1.0, 1.0)
-    angle = acos(x)
+    """Given arrays of vectors u and v, returns angles between paired vectors in radians."""
+    du = sqrt((u**2).sum(axis=-1))
+    dv = sqrt((v**2).sum(axis=-1))
+    du = maximum(du,spacing(1))
+    dv = maximum(dv,spacing(1))
+
+    x = (u*v).sum(axis=-1) / (du*dv)
+    x = clip(x, -1.0, 1.0)
+    angle = arccos(x)
     return angle
 
-def laplaciantension(vertex, faceindex, vert_tri_dict):
+def laplaciantension(vertex, faceindex, vert_tri_dict=None):
+    """Returns sparse cotangent Laplacian of a mesh as a CSR matrix. vert_tri_dict is unused, kept for compatibility.
+
+    For every polygon corner i with other polygon vertices j and k, weights
+    cot(angle at k) and cot(angle at j) are added to entries (i,j) and (i,k).
+    Diagonal entries are minus the sum of the rest of their row."""
     n = len(vertex)
-    L = lil_matrix((n,n))
-    ring = vert_tri_dict
-    
-    for i in range(0,n): 
-        for b in ring[i]:
-            bf = faceindex[b]          
-            if bf[0] == i:
-                v = (bf[1],bf[2])
-            else:
-                if bf[1] == i:
-                    v = (bf[0],bf[2])
-                else:
-                    if bf[2] == i:
-                        v = (bf[0],bf[1])
-                    else:
-                        print("Problem in face ring.")
-            j = v[0]
-            k = v[1]
-            vi = vertex[i]
-            vj = vertex[j]
-            vk = vertex[k]
-
-            # angles
-            alpha = My_Angle(vk-vi, vk-vj)
-            beta = My_Angle(vj-vi, vj-vk)
-            
-            # add weight
-            if alpha == 0:
-                cot_alpha = 0
-            else:
-                cot_alpha = 1/tan(alpha)
-            
-            if beta == 0:
-                cot_beta = 0
-            else:
-                cot_beta = 1/tan(beta)
-            
-            L[i,j] = L[i,j] + cot_alpha
-            L[i,k] = L[i,k] + cot_beta
-            
-    a = L.sum(axis=1)
-    b = [float(i) for i in a]
-    L = L - diag(b)
-                
-    return L
-
-def smooth(vertex, faceindex, iternum, stepsize, vert_tri_dict):
-    L = laplaciantension(vertex, faceindex, vert_tri_dict)
+    f0, f1, f2 = faceindex[:,0], faceindex[:,1], faceindex[:,2]
+
+    rows = list()
+    cols = list()
+    weights = list()
+
+    for corner in range(3):
+        i = faceindex[:,corner]
+        # other two polygon vertices, in polygon order
+        j = where(f0 == i, f1, f0)
+        k = where((f0 == i) | (f1 == i), f2, f1)
+
+        vi = vertex[i]
+        vj = vertex[j]
+        vk = vertex[k]
+
+        # angles
+        alpha = My_Angle(vk-vi, vk-vj)
+        beta = My_Angle(vj-vi, vj-vk)
+
+        # add weight
+        with errstate(divide='ignore'):
+            cot_alpha = where(alpha == 0, 0, 1/tan(alpha))
+            cot_beta = where(beta == 0, 0, 1/tan(beta))
+
+        rows += [i, i]
+        cols += [j, k]
+        weights += [cot_alpha, cot_beta]
+
+    L = coo_matrix((concatenate(weights), (concatenate(rows), concatenate(cols))), shape=(n,n)).tocsr()
+    L = L - diags(asarray(L.sum(axis=1)).ravel())
+
+    return L.tocsr()
+
+def factorize(A):
+    """Given a sparse symmetric matrix, returns a function solving A x = b, or None if A is not positive definite.
+
+    Uses CHOLMOD sparse Cholesky decomposition if scikit-sparse is installed,
+    and SuperLU decomposition with symmetric pivoting otherwise."""
+    A = A.tocsc()
+
+    if sparsecholesky is not None:
+        try:
+            return sparsecholesky(A)
+        except CholmodNotPositiveDefiniteError:
+            return None
+
+    try:
+        factor = splu(A, permc_spec='MMD_AT_PLUS_A', diag_pivot_thresh=0, options=dict(SymmetricMode=True))
+    except RuntimeError:
+        return None
+
+    # with pivots on the diagonal only, A is positive definite if all pivots are positive
+    if (factor.perm_r != factor.perm_c).any() or (factor.U.diagonal() <= 0).any():
+        return None
+
+    return factor.solve
+
+def solver(vertex, faceindex, stepsize):
+    """Returns function applying one implicit fairing iteration to vertices, or None if the smoothing matrix is not positive definite."""
+    L = laplaciantension(vertex, faceindex)
     sparseidentity = identity(len(vertex))
 
     tochol = sparseidentity - (stepsize*L)
-    tochol = mat(tochol)
 
-    try:
-        R = cholesky(tochol).T # Upper-triangular matrix cholesky decomposition (.T makes it upper, normally it spits out lower)
-    except LinAlgError:
+    return factorize(tochol)
+
+def smooth(vertex, faceindex, iternum, stepsize, vert_tri_dict=None):
+    """Returns vertices after implicit fairing smooth, or "!" if the smoothing matrix is not positive definite. vert_tri_dict is unused, kept for compatibility."""
+    solve = solver(vertex, faceindex, stepsize)
+    if solve is None:
         print("Cholesky decomposition cannot be computed, mesh matrix is not positive definite.")
         return "!"
-    
+
     for k in range(0,iternum):
-        Q = solve(R.H, vertex)
-        vertex = solve(R,Q)
-      
+        vertex = solve(vertex)
+
     return vertex
-    
 
-    
+def geometrykey(vertex, faceindex):
+    """Returns hash of vertex and polygon arrays identifying a mesh geometry."""
+    key = sha1()
+    for array in (vertex, faceindex):
+        array = ascontiguousarray(array)
+        key.update(str((array.shape, array.dtype.str)).encode())
+        key.update(array.data)
+    return key.hexdigest()
+
+class SmoothCache(object):
+    """Class for caching implicit fairing factorizations and smoothed vertices of meshes.
+
+    Smoothing matrices depend only on the initial geometry, connectivity and
+    step size of a mesh, so they are factored once per mesh and step size and
+    reused. The most recent smoothing result is kept with each factorization,
+    so smoothing the same mesh for more iterations continues from it instead
+    of starting over. Least recently used entries are dropped beyond maxsize.
+
+    Args:
+        maxsize (int): Largest number of factorizations kept.
+
+    Attributes:
+        maxsize (int): Largest number of factorizations kept.
+        entries (OrderedDict): Associates (geometry hash, step size) keys with
+            [solve function, iterations, smoothed vertices] values, least
+            recently used first.
+    """
+    def __init__(self, maxsize=4):
+        self.maxsize = int(maxsize)
+        self.entries = OrderedDict()
+
+    def smooth(self, vertex, faceindex, iternum, stepsize):
+        """Returns vertices after implicit fairing smooth, or "!" if the smoothing matrix is not positive definite. See smooth function."""
+        key = (geometrykey(vertex, faceindex), float(stepsize))
+
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            solve = solver(vertex, faceindex, stepsize)
+            if solve is None:
+                print("Cholesky decomposition cannot be computed, mesh matrix is not positive definite.")
+                return "!"
+            entry = [solve, 0, vertex]
+
+        solve, done, smoothed = entry
+        if iternum < done:
+            done, smoothed = 0, vertex
+
+        for k in range(done,iternum):
+            smoothed = solve(smoothed)
+
+        self.entries[key] = [solve, iternum, smoothed]
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
 
+        return smoothed.copy()
 
-        
+    def clear(self):
+        """Removes all cached factorizations."""
+        self.entries.clear()
@@ -0,0 +1,170 @@
+'''
+Created on Oct 18, 2026
+
+This module checks a provided 3D mesh for problems that affect topographic
+variables (degenerate, duplicate or non-manifold polygons and unused vertices)
+using the MeshCheck class, optionally cleaning the mesh first. All checks are
+done over whole arrays at once so that the check can run once per mesh in
+large batches, and metrics can reuse its results instead of testing each
+polygon themselves.
+'''
+
+from numpy import ascontiguousarray, void, dtype, unique, floor, sort, cross, bincount, nonzero, arange, zeros
+
+CHECK_LEVELS = ('off', 'fast', 'strict')
+
+def repeated_index_faces(faces):
+    """Returns boolean mask of polygons listing the same vertex index more than once."""
+    return (faces[:,0] == faces[:,1]) | (faces[:,0] == faces[:,2]) | (faces[:,1] == faces[:,2])
+
+def duplicate_vertex_faces(vertices, faces):
+    """Returns boolean mask of polygons with two or more vertices at identical XYZ points."""
+    a = vertices[faces[:,0]]
+    b = vertices[faces[:,1]]
+    c = vertices[faces[:,2]]
+    return (a == b).all(axis=1) | (a == c).all(axis=1) | (b == c).all(axis=1)
+
+def row_keys(rows):
+    """Returns one hashable byte-string key per row of a 2D array, so rows can be compared as single values."""
+    rows = ascontiguousarray(rows)
+    return rows.view(dtype((void, rows.dtype.itemsize*rows.shape[1]))).ravel()
+
+def weld_map(vertices, tolerance=0):
+    """Returns, for each vertex, the index of the first vertex at the same XYZ point.
+
+    Args:
+        vertices (ndarray): Vertex XYZ points.
+        tolerance (float): If above 0, points are snapped to a grid of this
+            spacing before comparison.
+    """
+    points = vertices if tolerance == 0 else floor(vertices/tolerance)
+    # Adding 0.0 turns -0.0 into 0.0 so that both give the same key
+    _, first, inverse = unique(row_keys(points + 0.0), return_index=True, return_inverse=True)
+    return first[inverse.ravel()]
+
+class MeshCheck(object):
+    """Class for checking, and optionally cleaning, polygonal mesh data before topographic analysis.
+
+    When instanced, this class checks the mesh at the requested level and stores
+    the results. All attributes listed below are populated on instantiation;
+    checks not run at the requested level are left as None.
+
+    Args:
+        TopoMesh (TopoMesh object): Triangulated polygon mesh data.
+        level (str): 'off' (no checks), 'fast' (index-level checks) or 'strict'
+            (also zero-area polygons, duplicate polygons, non-manifold edges
+            and coincident vertices).
+        clean (bool): If true, weld vertices at identical points and remove
+            degenerate polygons, duplicate polygons and unreferenced vertices
+            from the mesh before checking it. Ignored when level is 'off'.
+        weldtol (float): Snapping distance for welding, 0 welds exact matches only.
+
+    Attributes:
+        Mesh (TopoMesh object): Triangulated polygon mesh data.
+        vertices (ndarray): Vertex array the checks apply to.
+        faces (ndarray): Face array the checks apply to.
+        repeated_index_faces (ndarray): Polygons listing a vertex index twice.
+        duplicate_vertex_faces (ndarray): Polygons with two or more vertices at
+            identical XYZ points (includes repeated_index_faces).
+        unreferenced_vertices (ndarray): Vertices not used by any polygon.
+        zero_area_faces (ndarray): Polygons with zero area (strict).
+        duplicate_faces (ndarray): Polygons using the same three vertices as an
+            earlier polygon (strict).
+        nonmanifold_edges (ndarray): Vertex index pairs of edges shared by more
+            than two polygons (strict).
+        coincident_vertices (ndarray): Vertices at the same XYZ point as an
+            earlier vertex (strict).
+        removed_vertices (int): Number of vertices removed by cleaning.
+        removed_faces (int): Number of polygons removed by cleaning.
+        report (dict): Counts of each of the above, for logging.
+    """
+    def __init__(self, TopoMesh, level="fast", clean=False, weldtol=0):
+        if level not in CHECK_LEVELS:
+            raise ValueError('Mesh check level must be one of %s, not %s.' % (', '.join(CHECK_LEVELS), level))
+
+        self.Mesh = TopoMesh
+        self.level = level
+        self.clean = clean
+        self.weldtol = weldtol
+
+        self.vertices = None
+        self.faces = None
+        self.repeated_index_faces = None
+        self.duplicate_vertex_faces = None
+        self.unreferenced_vertices = None
+        self.zero_area_faces = None
+        self.duplicate_faces = None
+        self.nonmanifold_edges = None
+        self.coincident_vertices = None
+        self.removed_vertices = 0
+        self.removed_faces = 0
+        self.report = dict()
+
+        self.checkmesh()
+
+    def checkmesh(self):
+        """Method for cleaning and checking the mesh and populating instance variables."""
+        self.report['level'] = self.level
+
+        if self.level == 'off':
+            return
+
+        self.Mesh.check_mesh_consistency()
+
+        if self.clean:
+            self._cleanmesh()
+
+        self.vertices = self.Mesh.vertices
+        self.faces = self.Mesh.faces
+
+        self.repeated_index_faces = nonzero(repeated_index_faces(self.faces))[0]
+        self.duplicate_vertex_faces = nonzero(duplicate_vertex_faces(self.vertices, self.faces))[0]
+        self.unreferenced_vertices = nonzero(bincount(self.faces.ravel(), minlength=len(self.vertices)) == 0)[0]
+
+        if self.level == 'strict':
+            tv = self.vertices[self.faces]
+            twiceareas = (cross(tv[:,1]-tv[:,0], tv[:,2]-tv[:,0])**2).sum(axis=1)
+            self.zero_area_faces = nonzero(twiceareas == 0)[0]
+
+            _, firstface = unique(row_keys(sort(self.faces, axis=1)), return_index=True)
+            isfirst = zeros(len(self.faces), bool)
+            isfirst[firstface] = True
+            self.duplicate_faces = nonzero(~isfirst)[0]
+
+            topology = self.Mesh.topology
+            self.nonmanifold_edges = topology.edges[topology.edge_nface > 2]
+
+            self.coincident_vertices = nonzero(weld_map(self.vertices, self.weldtol) != arange(len(self.vertices)))[0]
+
+        for name in ('repeated_index_faces', 'duplicate_vertex_faces', 'unreferenced_vertices',
+                     'zero_area_faces', 'duplicate_faces', 'nonmanifold_edges', 'coincident_vertices'):
+            found = getattr(self, name)
+            if found is not None:
+                self.report[name] = len(found)
+        self.report['removed_vertices'] = self.removed_vertices
+        self.report['removed_faces'] = self.removed_faces
+
+    def _cleanmesh(self):
+        """Welds vertices, removes degenerate and duplicate polygons and unreferenced vertices, and updates the mesh."""
+        vertices = self.Mesh.vertices
+        faces = weld_map(vertices, self.weldtol)[self.Mesh.faces]
+
+        faces = faces[~repeated_index_faces(faces)]
+        _, firstface = unique(row_keys(sort(faces, axis=1)), return_index=True)
+        faces = faces[sort(firstface)]
+
+        used = bincount(faces.ravel(), minlength=len(vertices)) > 0
+        newindex = used.cumsum() - 1
+
+        self.removed_vertices = len(vertices) - int(used.sum())
+        self.removed_faces = len(self.Mesh.faces) - len(faces)
+
+        if self.removed_vertices > 0 or self.removed_faces > 0:
+            self.Mesh.vertices = vertices[used]
+            self.Mesh.faces = newindex[faces]
+            self.Mesh.nvert = len(self.Mesh.vertices)
+            self.Mesh.nface = len(self.Mesh.faces)
+
+    def matches(self, TopoMesh):
+        """Returns true if checks were run on the current vertex and face arrays of the given mesh."""
+        return self.level != 'off' and self.vertices is TopoMesh.vertices and self.faces is TopoMesh.faces
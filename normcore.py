@@ -6,7 +6,8 @@ Functions for the creation and manipulation of normal vectors.
 @author: Julia M. Winchester
 '''
 
-from numpy import cross, array, sqrt, column_stack, spacing, zeros, isnan, mean, sum
+from numpy import cross, sqrt, column_stack, spacing, zeros, isnan, mean, sum, where, ones, add, unique, repeat
+from scipy.sparse import csr_matrix
 
 def normal(plane):
     """Given triangle vertices, returns normal vector for triangle as XYZ coordinates."""
@@ -22,51 +23,72 @@ def normal(plane):
 
 def normalmap(varray,farray): 
     """Given a list of vertices and polygons, returns array of polygon normal vectors."""
-    return array([normal(varray[verts]) for verts in farray])
+    a = varray[farray[:,0]]
+    return cross(varray[farray[:,1]]-a, varray[farray[:,2]]-a)
+
+def facearea(varray,farray):
+    """Given a list of vertices and polygons, returns array of polygon areas (half the magnitudes of polygon normal vectors)."""
+    return 0.5*sqrt((normalmap(varray,farray)**2).sum(axis=1))
 
 def normalize(vects):
     """Normalizes (sets magnitude to 1) given vectors."""
     d = sqrt((vects**2).sum(axis=1)) # Square roots of sums of squares of normal vectors, i.e. magnitudes of normal vectors
-    d = [1 if m < spacing(1) else m for m in d]
+    d = where(d < spacing(1), 1, d)
     return vects/column_stack((d,d,d)) # each face has its normal vector XYZ divided by that vector's magnitude. this normalizes the vector, i.e. gives it a magnitude of 1.   
 
-def computenormal(varray, faceindex, fvarray, vfarray):
-    """Given a polygonal mesh, returns unit normals for polygons and unit normals of vertices (approximated as average of associated polygon normals)."""
+def vertexsum(fvalues, faceindex, nvert, topology=None):
+    """Given per-polygon vectors, returns for each vertex the sum of vectors of polygons using that vertex.
+
+    With a MeshTopology this is one sparse vertex-polygon incidence product,
+    otherwise values are accumulated over the face array."""
+    if topology is not None:
+        incidence = csr_matrix((ones(len(topology.vert_face_idx)), topology.vert_face_idx, topology.vert_face_ptr),
+                               shape=(nvert, len(fvalues)))
+        return incidence.dot(fvalues)
+
+    vsum = zeros([nvert,3],float)
+    add.at(vsum, faceindex.ravel(), repeat(fvalues, faceindex.shape[1], axis=0))
+    return vsum
+
+def computenormal(varray, faceindex, fvarray=None, vfarray=None, topology=None):
+    """Given a polygonal mesh, returns unit normals for polygons and unit normals of vertices (approximated as average of associated polygon normals).
+
+    Args:
+        varray (ndarray): Vertex XYZ points.
+        faceindex (ndarray): Polygons with component vertex indices.
+        fvarray: Unused, kept for compatibility.
+        vfarray (dict): Unused, vertex-polygon associations are taken from
+            faceindex or topology. Kept for compatibility.
+        topology (MeshTopology object): Precomputed connectivity of the mesh,
+            used for summing polygon normals at vertices if given.
+    """
     nvert = len(varray)
-    
+
     fnormal = normalmap(varray,faceindex)
     # normalize face normals
     fnormal4 = normalize(fnormal)
-    
-    # unit normals of vertices    
-    vnormal = zeros([nvert,3],float)
-    for vindex, faces in vfarray.items():
-        vnormal[vindex] = sum(fnormal4[faces], axis=0)
-        if isnan(fnormal4[faces]).any(): print("nan found during vertex normal creation at vertex #: " + str(vindex))    
-     
+
+    # unit normals of vertices
+    vnormal = vertexsum(fnormal4, faceindex, nvert, topology)
+    nanfaces = isnan(fnormal4).any(axis=1)
+    if nanfaces.any(): print("nan found during vertex normal creation at %d vertices" % len(unique(faceindex[nanfaces])))
+
     # normalize vertex normals
     vnormal4 = normalize(vnormal)
     
     # check for nan values in vnormal4
-    for i, norm in enumerate(vnormal4):
-        if isnan(norm).any():
-            print("nan vnormal 4 entry found")
-            print("corresponding vnormal entry:")
-            print(norm)
-    
+    nanvertices = int(isnan(vnormal4).any(axis=1).sum())
+    if nanvertices > 0:
+        print("%d nan vnormal 4 entries found" % nanvertices)
+
     # enforce that normals are outward
-    mvertex = mean(varray,1)    
-    repmvertex = column_stack((mvertex,mvertex,mvertex))            
+    mvertex = mean(varray,1)
+    repmvertex = column_stack((mvertex,mvertex,mvertex))
     v = varray - repmvertex
     s = sum((v*vnormal4),0)
-    s2 = 0
-    s3 = 0
-    
-    for i in s:
-        if i > 0:
-            s2 += 1
-        if i < 0:
-            s3 += 1
+    s2 = int((s > 0).sum())
+    s3 = int((s < 0).sum())
+
     if s2 < s3:
         print('Outward normal flipping has occurred')
         vnormal4 = -vnormal4
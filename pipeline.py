@@ -0,0 +1,177 @@
+'''
+Created on Oct 18, 2026
+
+This module computes any subset of tooth height, cusp metrics, OPCR, DNE and
+RFI for many meshes, loading each mesh once and writing one table row per
+tooth. Metrics share the parsed mesh and what is cached on it (topology,
+polygon areas, normals and smoothing factorizations) instead of each metric
+script reading and parsing every file again. Run as a script to process a
+directory of .ply or .off files with a pool of worker processes (see batch.py).
+'''
+
+import os
+
+# One BLAS thread per worker process, so that workers do not compete for cores
+for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(variable, "1")
+
+import sys
+import argparse
+import functools
+from numpy import round as npround
+from topomesh import TopoMesh
+import batch
+
+METRICS = ('height', 'cusps', 'opc', 'dne', 'rfi')
+
+DNE_DEFAULTS = dict(dosmooth=0, smoothit=3, smoothstep=0.1, docondition=1, dooutlier=1, outlierperc=99.9, outliertype=0)
+
+def columns(metrics, minpatch=(3,)):
+    """Returns output table column names for the given metrics, after the file name column. The last
+    column lists metrics that could not be calculated for a mesh whose other metrics were."""
+    names = list()
+    if 'height' in metrics:
+        names += ['Height', 'Tall enough']
+    if 'cusps' in metrics:
+        names += ['Radians', 'Degrees', 'Real cusps', 'Fails inhib']
+    if 'opc' in metrics:
+        names += ['OPC min %d' % size for size in minpatch]
+    if 'dne' in metrics:
+        names += ['DNE']
+    if 'rfi' in metrics:
+        names += ['RFI', 'Surface area', 'Projected area']
+    return names + ['Errors']
+
+def analyze(path, metrics=METRICS, minpatch=(3,), dne=None, rfimethod="raster", rfiresolution=1000):
+    """Loads one mesh and returns its values for the given metrics, in the order of columns().
+
+    Args:
+        path (str): Path to a .ply or .off polygon mesh file.
+        metrics (list): Metric names, any of METRICS.
+        minpatch (list): Minimum patch sizes for OPCR.
+        dne (dict): Settings for DNE.MeshDNE, see DNE_DEFAULTS, which fills in
+            any setting not given.
+        rfimethod (str): Projected area method for RFI, see RFI.MeshRFI class.
+        rfiresolution (int): Raster resolution for RFI, see RFI.MeshRFI class.
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError('Metrics must be among %s, not %s.' % (', '.join(METRICS), ', '.join(sorted(unknown))))
+
+    mesh = TopoMesh(path)
+    values = list()
+    errors = list()
+
+    if 'height' in metrics:
+        import check_height
+        tall, height = check_height.tooth_height(mesh.vertices)
+        values += [height, int(tall)]
+
+    if 'cusps' in metrics:
+        import count_cusp_off
+        # cusps are found on vertices rounded as count_cusp_off.read_off_file does, with
+        # neighbors along the polygons of .off files rather than their triangle fan diagonals
+        vertices = npround(mesh.vertices, 6)
+        if mesh.polygons is None:
+            cusps = count_cusp_off.cusp_metrics(vertices, mesh.faces, mesh.topology)
+        else:
+            cusps = count_cusp_off.cusp_metrics(vertices, mesh.polygons)
+        radians, degrees, realcusps, passes = cusps
+        values += [radians, degrees, realcusps, "" if passes else "FAILS"]
+
+    if 'opc' in metrics:
+        mesh.GenerateOPCR(list(minpatch), retain="counts")
+        values += mesh.OPCR
+
+    if 'dne' in metrics:
+        settings = dict(DNE_DEFAULTS, **(dne or {}))
+        mesh.GenerateDNE(settings['dosmooth'], settings['smoothit'], settings['smoothstep'], settings['docondition'],
+                         settings['dooutlier'], settings['outlierperc'], settings['outliertype'], "")
+        if mesh.DNE is None:
+            # MeshDNE returns without DNE when the implicit fairing matrix cannot be factorized
+            errors.append('DNE: smoothing failed as the implicit fairing matrix is not positive definite')
+        values += [mesh.DNE]
+
+    if 'rfi' in metrics:
+        mesh.GenerateRFI(rfimethod, rfiresolution)
+        values += [mesh.RFI, mesh.surfarea, mesh.projarea]
+
+    return values + ["; ".join(errors)]
+
+def format_row(name, values):
+    """Returns one comma separated output table line."""
+    return ",".join([name] + ["" if value is None else str(value) for value in values]) + "\n"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate several topographic variables of every .ply and .off file in a directory, loading each mesh once. One row per tooth is appended to the output table as meshes finish, and meshes already in the table are skipped.")
+    parser.add_argument("input_dir", help="Directory containing .ply and .off files")
+    parser.add_argument("output_table", help="Output .csv table, resumed if it exists. Errors are written next to it with _errors.txt appended to its name")
+    parser.add_argument("--metrics", default=",".join(METRICS), help="Comma separated metrics among %s (default: all)" % ", ".join(METRICS))
+    parser.add_argument("--minpatch", default="3", help="Minimum OPC patch size, or comma separated list of sizes (default: 3)")
+    parser.add_argument("--dne-smooth", type=int, default=0, help="Implicit fairing iterations before DNE, 0 for no smoothing (default: 0)")
+    parser.add_argument("--dne-step", type=float, default=DNE_DEFAULTS['smoothstep'], help="Implicit fairing step size (default: 0.1)")
+    parser.add_argument("--dne-outlier", type=float, default=DNE_DEFAULTS['outlierperc'], help="DNE outlier percentile, 0 for no outlier removal (default: 99.9)")
+    parser.add_argument("--dne-outlier-type", type=int, choices=(0, 1), default=DNE_DEFAULTS['outliertype'], help="DNE outliers as energy (0) or energy*area (1) (default: 0)")
+    parser.add_argument("--dne-no-condition", action="store_true", help="Do not ignore polygons with high condition numbers in DNE")
+    parser.add_argument("--rfi-method", choices=("raster", "exact", "plot"), default="raster", help="RFI projected area method (default: raster)")
+    parser.add_argument("--rfi-resolution", type=int, default=1000, help="RFI raster resolution (default: 1000)")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Meshes sent to a worker at once (default: about 16 chunks per worker)")
+    parser.add_argument("--timeout", type=float, default=300, help="Time limit in seconds for one mesh, 0 for none (default: 300)")
+    parser.add_argument("--retries", type=int, default=1, help="Number of times a failed mesh is run again (default: 1)")
+    parser.add_argument("--restart", action="store_true", help="Start a new output table instead of resuming the existing one")
+    args = parser.parse_args()
+
+    metrics = [metric for metric in args.metrics.split(',') if metric]
+    if set(metrics) - set(METRICS):
+        print(f"Error: metrics must be among {', '.join(METRICS)}.")
+        sys.exit(1)
+    minpatch = [int(size) for size in args.minpatch.split(',')]
+    dne = dict(dosmooth=int(args.dne_smooth > 0), smoothit=args.dne_smooth, smoothstep=args.dne_step,
+               docondition=int(not args.dne_no_condition), dooutlier=int(args.dne_outlier > 0),
+               outlierperc=args.dne_outlier, outliertype=args.dne_outlier_type)
+
+    # Check if the input directory exists
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: Input directory '{args.input_dir}' does not exist.")
+        sys.exit(1)
+
+    header = ",".join(["Filename"] + columns(metrics, minpatch)) + "\n"
+
+    finished = set()
+    if os.path.isfile(args.output_table) and os.path.getsize(args.output_table) > 0 and not args.restart:
+        with open(args.output_table, 'r') as table:
+            if table.readline() != header:
+                print(f"Error: '{args.output_table}' was made with different metrics or patch sizes. Use --restart to replace it.")
+                sys.exit(1)
+        finished = batch.finished_names(args.output_table)
+
+    paths = [path for path in batch.mesh_files(args.input_dir) if os.path.basename(path) not in finished]
+    print(f"{len(paths)} meshes to process, {len(finished)} already in {args.output_table}")
+
+    table = open(args.output_table, 'w' if args.restart else 'a')
+    if table.tell() == 0:
+        table.write(header)
+    errors = open(os.path.splitext(args.output_table)[0] + "_errors.txt", 'a')
+
+    done = 0
+    failed = 0
+    incomplete = 0
+    function = functools.partial(analyze, metrics=metrics, minpatch=minpatch, dne=dne, rfimethod=args.rfi_method, rfiresolution=args.rfi_resolution)
+    for path, values, error in batch.run_batch(function, paths, args.workers, args.chunksize, args.timeout, args.retries):
+        filename = os.path.basename(path)
+        if error is not None:
+            failed += 1
+            errors.write(f"{filename}\t{error}\n")
+            errors.flush()
+            continue
+
+        done += 1
+        if values[-1]:
+            incomplete += 1
+        table.write(format_row(filename, values))
+        table.flush()
+
+    table.close()
+    errors.close()
+    print(f"Finished. {done} meshes calculated ({incomplete} with some metrics missing, see the Errors column), {failed} failed. Results stored in {args.output_table}")
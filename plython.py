@@ -2,10 +2,12 @@
 Created on Sep 1, 2011
 
 Plython opens .ply files and produces simple numpy arrays with polygon vertex and face data. Using 
-the createarray() function, this module reads ASCII-format .ply (binary is not supported to date) 
+the createarray() function, this module reads ASCII and binary (either byte order) .ply files
 and returns numpy arrays representing position of mesh vertices and connections between vertices
 to produce interconnected triangular polygon faces. A savearray() function is also provided to save
 arrays of mesh data (formatted similarly to arrays returned by the createarray() function). 
+Geomview .off/COFF files, as written by ToothMaker, are read in the same way through read_off(),
+with polygons of more than three vertices split into triangles.
 
 Mesh .ply files are initiated with headers defining basic mesh properties and subsequent lists of 
 mesh property data. To read mesh files, the functions included here first retrieve the number of 
@@ -20,8 +22,98 @@ three arrays as a list in the order described.
 
 @author: Julia M. Winchester
 '''
-from numpy import array
-from struct import unpack
+from numpy import array, fromstring, frombuffer, dtype, zeros, full, column_stack, ascontiguousarray
+from numpy import arange, repeat, cumsum, bincount, uint8, split
+
+# Numpy type codes for .ply property types
+PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+             'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+             'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+             'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+# Lookup table of ASCII whitespace byte values
+WHITESPACE = zeros(256, bool)
+WHITESPACE[[9, 10, 11, 12, 13, 32]] = True
+
+def read_off(filepath, polygons=False):
+    """Reads an .off or COFF polygon mesh file.
+    
+    Args:
+        filepath (str): Path to an .off polygon mesh file.
+        polygons (bool): Whether to also return polygons as written in the file.
+    
+    Returns:
+        Vertex XYZ points (ndarray) and polygons with component vertex indices
+        (ndarray), with polygons of more than three vertices split into triangle fans.
+        If polygons is True, followed by a list of the original polygons, each
+        a list of vertex indices in file order.
+    """
+    meshfile = open(filepath, 'rb')
+    meshbytes = meshfile.read()
+    meshfile.close()
+    return parse_off(meshbytes, polygons)
+
+def parse_off(meshbytes, polygons=False):
+    """Parses the contents of an .off or COFF file, see read_off()."""
+    firstline, rest = (meshbytes.lstrip() + b'\n').split(b'\n', 1)
+    words = firstline.split()
+    
+    if len(words) == 0 or words[0] not in (b'OFF', b'COFF'):
+        raise ValueError('The file is not in OFF or COFF format.')
+    
+    # Element counts follow the keyword on the same line or on the next line
+    if len(words) > 1:
+        counts = words[1:]
+    else:
+        countline, rest = (rest + b'\n').split(b'\n', 1)
+        counts = countline.split()
+    nvert, nface = int(counts[0]), int(counts[1])
+    
+    # Number of values on each non-empty line, found from whitespace-to-text transitions
+    chars = frombuffer(rest, uint8)
+    space = WHITESPACE[chars]
+    starts = ~space
+    starts[1:] &= space[:-1]
+    linevalues = bincount(cumsum(chars == 10)[starts])
+    linevalues = linevalues[linevalues > 0]
+    
+    meshdata = fromstring(rest, sep=' ')
+    
+    if len(meshdata) != linevalues.sum():
+        raise ValueError('Non-numeric values found within .OFF file.')
+    if len(linevalues) < nvert:
+        raise EOFError('Unexpected end of .OFF file in list of vertices.')
+    if len(linevalues) < nvert+nface:
+        raise EOFError('Unexpected end of .OFF file in list of polygon vertex indices.')
+    
+    vertcols = linevalues[0] if nvert > 0 else 3
+    if vertcols < 3 or (linevalues[:nvert] != vertcols).any():
+        raise ValueError('Inconsistent vertex lines found within .OFF file.')
+    
+    varray = meshdata[:nvert*vertcols].reshape([nvert, vertcols])[:,0:3].copy()
+    
+    # Each polygon line holds a vertex count followed by that many indices, then optional colour values
+    facevalues = linevalues[nvert:nvert+nface]
+    facestarts = nvert*vertcols + cumsum(facevalues) - facevalues
+    polysize = meshdata[facestarts].astype(int)
+    
+    if (polysize < 3).any() or (polysize >= facevalues).any():
+        raise ValueError('Invalid polygons found within .OFF file.')
+    
+    # Fan triangulation: polygon (v0, v1, ..., vk) becomes triangles (v0, vj, vj+1)
+    ntri = polysize - 2
+    trifirst = repeat(facestarts + 1, ntri)
+    trinum = arange(ntri.sum()) - repeat(cumsum(ntri) - ntri, ntri) + 1
+    farray = column_stack((meshdata[trifirst], meshdata[trifirst+trinum], meshdata[trifirst+trinum+1])).astype(int)
+    
+    if not polygons:
+        return varray, farray
+    
+    # Original polygons, for uses where the triangle fan diagonals are not real edges
+    polyends = cumsum(polysize)
+    polyverts = meshdata[repeat(facestarts + 1, polysize) + arange(polysize.sum()) - repeat(polyends - polysize, polysize)].astype(int)
+    polylist = [polygon.tolist() for polygon in split(polyverts, polyends[:-1])] if nface > 0 else []
+    return varray, farray, polylist
     
 class PlythonMesh(object):
     """A class for creating and interacting with triangulated polygon meshes.
@@ -30,150 +122,204 @@ class PlythonMesh(object):
     mesh data if provided with a path to a .ply file. 
     
     Args:
-        filepath (str): Path to a .ply polygon mesh file. 
+        filepath (str): Path to a .ply or .off polygon mesh file. 
         
     Attributes:
         mesh (list): Triangulated polygon mesh data. Contains three ndarrays:
             vertex XYZ points, polygons with component vertex XYZ points, 
-            and polygons with component vertex indices. 
+            and polygons with component vertex indices. Built on access.
         vertices (ndarray): Vertex XYZ points for mesh.
         faces (ndarray): Polygons with component vertex indices for mesh.
         triverts (ndarray): Polygons with component vertex XYZ points for mesh.
+            Gathered from vertices and faces on access rather than stored.
         nvert (int): Number of vertices in mesh. 
         nface (int): Number of polygons in mesh.  
+        polygons (list): Polygons as read from an .off file, before splitting
+            into triangles, as lists of vertex indices. None for .ply files.
     
     """
     def __init__(self, filepath=""):
-        self.mesh = None
         self.vertices = None
         self.faces = None
-        self.triverts = None
+        self.polygons = None
         self.nvert = 0
         self.nface = 0
         
-        if filepath is not "":
+        if filepath != "":
             self.CreateArray(filepath)
     
     def CreateArray(self, filepath): 
-        """Creates triangulated polygon mesh data objects from .ply file.
+        """Creates triangulated polygon mesh data objects from .ply or .off file.
         
         Args:
-            filepath (str): Path to a .ply polygon mesh file.
+            filepath (str): Path to a .ply or .off polygon mesh file.
         
         """
-        meshfile = open(filepath, 'r') 
-        meshstring = meshfile.read()
+        meshfile = open(filepath, 'rb') 
+        meshbytes = meshfile.read()
         meshfile.close()
         
+        if meshbytes.lstrip().startswith(b'ply'):
+            self.vertices, self.faces = self._read_ply(meshbytes)
+        else:
+            self.vertices, self.faces = self._read_off(meshbytes)
+        
+        self.check_mesh_consistency()
+    
+    def _read_ply(self, meshbytes):
+        """Reads .ply mesh data in ASCII or binary format."""
+        header = meshbytes[:meshbytes.find(b'end_header')].decode('latin-1')
         
-        datamode = self._StringAfter(meshstring, 'format')
-        self.nvert = int(self._StringAfter(meshstring,'element vertex'))
-        self.nface = int(self._StringAfter(meshstring,'element face'))
+        datamode = self._StringAfter(header, 'format')
+        self.nvert = int(self._StringAfter(header,'element vertex'))
+        self.nface = int(self._StringAfter(header,'element face'))
         
         if datamode == "ascii" or datamode == "ASCII":
-            self.vertices, self.faces, self.triverts = self._read_ascii(meshstring)
+            return self._read_ascii(meshbytes.decode('latin-1'))
         else:
-            self.vertices, self.faces, self.triverts = self._read_bin(meshstring, datamode)
+            return self._read_bin(meshbytes, datamode)
+    
+    def _read_off(self, meshbytes):
+        """Reads .off mesh data, triangulating polygons with more than three vertices."""
+        varray, farray, self.polygons = parse_off(meshbytes, polygons=True)
         
-        self.mesh = [self.vertices, self.triverts, self.faces]
+        self.nvert = len(varray)
+        self.nface = len(farray)
         
-        self.check_mesh_consistency()
+        return varray, farray
     
     def _read_ascii(self, meshstring):
         """Reads ASCII mesh data."""
-        meshdata = meshstring[meshstring.find('end_header'):].splitlines()[1:]
+        vertprops = self._element_properties(meshstring, 'vertex')
+        faceprops = self._element_properties(meshstring, 'face')
         
-        if len(meshdata) < self.nvert:
-            raise EOFError('Unexpected end of .PLY file in list of vertices.')
+        # Values per vertex line, and per face line assuming the vertex index list holds 3 indices
+        vertcols = len(vertprops)
+        facecols = sum(4 if prop[0] == 'list' else 1 for prop in faceprops)
+        listcol = [prop[0] for prop in faceprops].index('list')
         
-        vlist = meshdata[0:self.nvert]
+        meshdata = fromstring(meshstring[meshstring.find('end_header')+len('end_header'):], sep=' ')
+        
+        vertvalues = self.nvert*vertcols
+        facevalues = self.nface*facecols
+        
+        if len(meshdata) < vertvalues:
+            raise EOFError('Unexpected end of .PLY file in list of vertices.')
         
-        if len(meshdata[self.nvert:]) < self.nface:
+        if len(meshdata[vertvalues:]) < facevalues:
             raise EOFError('Unexpected end of .PLY in list of polygon vertex indices.')
         
-        flist = meshdata[self.nvert:(self.nvert+self.nface)]
+        vlist = meshdata[0:vertvalues].reshape([self.nvert, vertcols])
+        flist = meshdata[vertvalues:vertvalues+facevalues].reshape([self.nface, facecols])
         
-        if flist[0][0] != '3':
+        if (flist[:,listcol] != 3).any():
             raise ValueError('Non-triangular polygons found within .PLY file.')
         
-        varray = array([vertices.split() for vertices in vlist], float)
-        farray = array([vertices.split()[1:4] for vertices in flist], int)
-        vfarray = array([[varray[vindex] for vindex in vertices] for vertices in farray], float)
+        varray = vlist[:,self._xyz_columns(vertprops)]
+        farray = flist[:,listcol+1:listcol+4].astype(int)
         
-        return varray, farray, vfarray 
+        return varray, farray
     
-    def _read_bin(self, meshstring, mode):
+    def _read_bin(self, meshbytes, mode):
         """Reads binary mesh data."""
         if mode == "binary_little_endian":
             byteorder = "<"
         elif mode == "binary_big_endian":
             byteorder = ">"
+        else:
+            raise ValueError('Unrecognized .PLY format %s.' % mode)
+        
+        headerend = meshbytes.find(b'end_header')
+        header = meshbytes[:headerend].decode('latin-1')
+        meshdata = memoryview(meshbytes)[meshbytes.find(b'\n', headerend)+1:]
         
-        meshdata = meshstring[meshstring.find('end_header')+11:]
+        # Vertex and face records are viewed in place as structured arrays, any extra properties are skipped by stride
+        vertdtype = self._element_dtype(self._element_properties(header, 'vertex'), byteorder)
+        facedtype = self._element_dtype(self._element_properties(header, 'face'), byteorder)
         
-        # Expected number of bytes for vertex data, assumes 3 XYZ coordinate float values
-        vertbytes = self.nvert*3*4
-        # Expected number of bytes for face data, assumes unsigned char (= 3) and 3 integer vertex index values 
-        facebytes = self.nface*(3*4+1)
+        vertbytes = self.nvert*vertdtype.itemsize
+        facebytes = self.nface*facedtype.itemsize
         
         if len(meshdata) < vertbytes:
             raise EOFError('Unexpected end of .PLY file in list of vertices.')
         
-        vertdata = meshdata[0:vertbytes]
-        
         if len(meshdata[vertbytes:]) < facebytes:
             raise EOFError('Unexpected end of .PLY in list of polygon vertex indices.')
         
-        facedata = meshdata[vertbytes:vertbytes+facebytes]
+        vertdata = frombuffer(meshdata, vertdtype, self.nvert, 0)
+        facedata = frombuffer(meshdata, facedtype, self.nface, vertbytes)
         
-        if unpack(byteorder+'B', facedata[0])[0] != 3:
-            raise ValueError('Non-triangular polygons found within .PLY file.')
-        
-        vert_xyz_split = [vertdata[i:i+4] for i in range(0, vertbytes, 4)]
-        vert_xyz_points = map(lambda x: unpack(byteorder+'f', x)[0], vert_xyz_split)
-        vert_array = array(vert_xyz_points)
-        vert_array = vert_array.reshape([self.nvert,3])
+        listname = [name for name in facedtype.names if facedtype[name].shape == (3,)][0]
         
-        face_split = [facedata[i:i+13] for i in range(0, facebytes, 13)]
-        face_index_split = [[face[i:i+4] for i in range(1, len(face), 4)] for face in face_split]
-        face_index_value = [[unpack(byteorder+'i', index)[0] for index in face] for face in face_index_split]
-        face_array = array(face_index_value)
-        face_array = face_array.reshape([self.nface,3])
+        if (facedata[listname+'_count'] != 3).any():
+            raise ValueError('Non-triangular polygons found within .PLY file.')
         
-        vert_face_array = array([[vert_array[vertex] for vertex in face] for face in face_array], float)
+        xyz = [vertdtype.names[i] for i in self._xyz_columns(self._element_properties(header, 'vertex'))]
+        vert_array = array([vertdata[axis] for axis in xyz], float).T.copy()
+        face_array = facedata[listname].astype(int)
         
-        return vert_array, face_array, vert_face_array
+        return vert_array, face_array
     
     def check_mesh_consistency(self):
         """Checks mesh data produced by CreateArray for consistency, raises exceptions if mesh is inconsistent or nonexistent."""
-        if self.vertices is None or self.faces is None or self.triverts is None:
+        if self.vertices is None or self.faces is None:
             raise ValueError('Mesh data is missing.')
-        if len(self.vertices) != self.nvert or len(self.faces) != self.nface or len(self.triverts) != self.nface:
-            raise ValueError('Unexpected vertex, face, or face-vertex index length, mesh is inconsistent.')
-        for i, trivert in enumerate(self.triverts):
-            if (trivert != self.vertices[self.faces[i]]).any():
-                raise ValueError("Mesh vertex and face arrays do not contain identical vertices, mesh is inconsistent.")
+        if len(self.vertices) != self.nvert or len(self.faces) != self.nface:
+            raise ValueError('Unexpected vertex or face length, mesh is inconsistent.')
+        if self.nface > 0 and (self.faces.min() < 0 or self.faces.max() >= self.nvert):
+            raise ValueError("Mesh face array refers to vertices outside vertex array, mesh is inconsistent.")
         
-    def SaveArray(self, filepath): 
-        """Saves mesh as an ASCII .ply format triangulated surface file.
+    def SaveArray(self, filepath, binary=False): 
+        """Saves mesh as an ASCII or binary .ply format triangulated surface file.
         
         Args:
             filepath (str): Path to a .ply polygon mesh file to be created.
+            binary (bool): If true, save as little-endian binary .ply with double
+                precision vertices. If false, save as ASCII .ply.
         
         """
         self.check_mesh_consistency()
         
-        arrayfile = open(filepath,'w')
-        arrayfile.write("ply\nformat ascii 1.0\nelement vertex %s\n" % self.nvert)
-        arrayfile.write("property float32 x\nproperty float32 y\nproperty float32 z\nelement face %s\nproperty list uint8 int32 vertex_indices\nend_header\n" % self.nface)
-        
-        for xyz in self.Vertices():
-            arrayfile.write(str(xyz[0])+" "+str(xyz[1])+" "+str(xyz[2])+"\n")
-        
-        for vertexindices in self.Triangles():
-            arrayfile.write("3 " + str(int(vertexindices[0]))+" "+str(int(vertexindices[1]))+" "+str(int(vertexindices[2]))+"\n")
+        if binary:
+            arrayfile = open(filepath,'wb')
+            arrayfile.write(("ply\nformat binary_little_endian 1.0\nelement vertex %s\n" % self.nvert).encode('ascii'))
+            arrayfile.write(("property double x\nproperty double y\nproperty double z\nelement face %s\nproperty list uchar int vertex_indices\nend_header\n" % self.nface).encode('ascii'))
+            
+            facerecords = zeros(self.nface, dtype([('vertex_indices_count', '<u1'), ('vertex_indices', '<i4', (3,))]))
+            facerecords['vertex_indices_count'] = 3
+            facerecords['vertex_indices'] = self.Triangles()
+            
+            ascontiguousarray(self.Vertices(), '<f8').tofile(arrayfile)
+            facerecords.tofile(arrayfile)
+        else:
+            arrayfile = open(filepath,'w')
+            arrayfile.write("ply\nformat ascii 1.0\nelement vertex %s\n" % self.nvert)
+            arrayfile.write("property float32 x\nproperty float32 y\nproperty float32 z\nelement face %s\nproperty list uint8 int32 vertex_indices\nend_header\n" % self.nface)
+            
+            arrayfile.write(self._format_rows(self.Vertices()))
+            arrayfile.write(self._format_rows(column_stack((full(self.nface, 3), self.Triangles())).astype(int)))
             
         arrayfile.close()
+    
+    def _format_rows(self, rowarray):
+        """Internal method formatting a 2D array as space-separated text lines in one bulk conversion."""
+        if len(rowarray) == 0:
+            return ""
+        return "\n".join(" ".join(row) for row in rowarray.astype(str).tolist()) + "\n"
+        
+    @property
+    def triverts(self):
+        """Polygons with component vertex XYZ points, gathered from vertices and faces."""
+        if self.vertices is None or self.faces is None:
+            return None
+        return self.vertices[self.faces]
+    
+    @property
+    def mesh(self):
+        """Triangulated polygon mesh data as [vertices, triverts, faces]."""
+        if self.vertices is None or self.faces is None:
+            return None
+        return [self.vertices, self.triverts, self.faces]
         
     def Vertices(self):
         """Returns vertex XYZ data points."""
@@ -191,6 +337,39 @@ class PlythonMesh(object):
         """Returns triangulated polygon mesh data."""
         return self.mesh
     
+    def _element_properties(self, text, element):
+        """Internal method returning split property lines declared for an element in a .ply header."""
+        header = text[:text.find('end_header')].splitlines()
+        properties = list()
+        inelement = False
+        for line in header:
+            words = line.split()
+            if len(words) == 0:
+                continue
+            if words[0] == 'element':
+                inelement = (words[1] == element)
+            elif words[0] == 'property' and inelement:
+                properties.append(words[1:])
+        return properties
+    
+    def _element_dtype(self, properties, byteorder):
+        """Internal method returning a structured numpy dtype for binary records of an element, assuming lists hold 3 values."""
+        fields = list()
+        for prop in properties:
+            if prop[0] == 'list':
+                fields.append((prop[3]+'_count', byteorder+PLY_TYPES[prop[1]]))
+                fields.append((prop[3], byteorder+PLY_TYPES[prop[2]], (3,)))
+            else:
+                fields.append((prop[1], byteorder+PLY_TYPES[prop[0]]))
+        return dtype(fields)
+    
+    def _xyz_columns(self, vertprops):
+        """Internal method returning column indices of XYZ coordinates among vertex properties."""
+        names = [prop[-1] for prop in vertprops]
+        if all(axis in names for axis in ('x', 'y', 'z')):
+            return [names.index(axis) for axis in ('x', 'y', 'z')]
+        return [0, 1, 2]
+    
     def _StringAfter(self,text,phrase): 
         """Internal method for finding first discrete word or number (separated by spaces) after phrase in text."""
         try:
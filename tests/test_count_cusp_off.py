@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+import count_cusp_off
+from plython import read_off
+
+# Heights (-Z) of a 5 x 5 grid of vertices, with X along rows. The peak at (2,2) is
+# only a local maximum along quad edges, as (3,3) is higher across the quad diagonal.
+HEIGHTS = [[0, 0, 0, 0, 0],
+           [0, 0, 0, 0, 0],
+           [0, 0, 1, 0, 0],
+           [0, 0, 0, 2, 0],
+           [0, 0, 0, 0, 0]]
+
+def write_quad_off(path):
+    """Writes the grid as an .off file of quads, each written twice with different
+    starting vertices as ToothMaker does, so that triangle fans of the two copies
+    would join both diagonals."""
+    vertices = ["%d %d %d" % (x, y, -HEIGHTS[x][y]) for x in range(5) for y in range(5)]
+    quads = list()
+    for x in range(4):
+        for y in range(4):
+            quad = [5*x + y, 5*(x+1) + y, 5*(x+1) + y + 1, 5*x + y + 1]
+            quads.append("4 %d %d %d %d" % tuple(quad))
+            quads.append("4 %d %d %d %d" % tuple(quad[1:] + quad[:1]))
+    with open(path, 'w') as offfile:
+        offfile.write("OFF\n%d %d 0\n" % (len(vertices), len(quads)))
+        offfile.write("\n".join(vertices + quads) + "\n")
+
+def test_read_off_polygons(tmp_path):
+    path = str(tmp_path / "quads.off")
+    write_quad_off(path)
+    vertices, faces, polygons = read_off(path, polygons=True)
+    assert len(polygons) == 32
+    assert polygons[0] == [0, 5, 6, 1]
+    assert polygons[1] == [5, 6, 1, 0]
+    assert len(faces) == 64
+
+def test_quad_cusps_use_polygon_edges(tmp_path):
+    path = str(tmp_path / "quads.off")
+    write_quad_off(path)
+    vertices, faces = count_cusp_off.read_off_file(path)
+    cusps = count_cusp_off.find_cusps(vertices, faces)
+    assert sorted(cusps) == [[2.0, 2.0, -1.0], [3.0, 3.0, -2.0]]
+    assert count_cusp_off.cusp_metrics(vertices, faces)[2] == 2
+
+def test_triangle_topology_matches_polygon_edges(tmp_path):
+    from topology import MeshTopology
+    path = str(tmp_path / "quads.off")
+    write_quad_off(path)
+    vertices, faces = read_off(path)
+    # a single fan diagonal per quad, with the same edges given as triangles or as polygons
+    faces = faces[::2]
+    topology = MeshTopology(faces, len(vertices))
+    assert count_cusp_off.find_cusps(vertices, faces.tolist()) == count_cusp_off.find_cusps(vertices, faces, topology)
+
+def test_invalid_faces_raise():
+    vertices = [[0, 0, 0], [1, 0, 0], [1, 1, -1], [0, 1, 0]]
+    for faces in (np.arange(12), [0, 1, 2, 3], [[0, 1]], [[0, 1, 4]], [[0, 1, 2, 3], [0, 2]]):
+        with pytest.raises(ValueError):
+            count_cusp_off.find_cusps(vertices, faces)
+    # polygons of mixed sizes are accepted as they are
+    assert count_cusp_off.find_cusps(vertices, [[0, 1, 2, 3], [0, 2, 3]]) == []
@@ -0,0 +1,42 @@
+import numpy as np
+from numpy.linalg import inv
+import DNE
+from topomesh import TopoMesh
+
+def sliver_mesh():
+    """Returns a 4 x 4 grid surface whose corner triangle is split around a vertex
+    just off its boundary edge, leaving a thin triangle whose G matrix has an analytic
+    determinant below 0 but still inverts."""
+    xs, ys = np.meshgrid(np.arange(4.0), np.arange(4.0), indexing='ij')
+    xs, ys = xs.ravel(), ys.ravel()
+    vertices = np.column_stack((xs, ys, 0.1*xs*ys - 0.05*xs**2))
+    faces = list()
+    for x in range(3):
+        for y in range(3):
+            a, b, c, d = 4*x + y, 4*(x+1) + y, 4*(x+1) + y + 1, 4*x + y + 1
+            faces += [[a, b, c], [a, c, d]]
+    
+    a, b, c = vertices[0], vertices[4], vertices[5]
+    vertices = np.vstack((vertices, a + 0.1*(b - a) + 1e-11*(c - a)))
+    faces.remove([0, 4, 5])
+    faces += [[0, 4, 16], [0, 16, 5], [16, 4, 5]]
+    
+    mesh = TopoMesh()
+    mesh.vertices = vertices
+    mesh.faces = np.array(faces)
+    mesh.nvert = len(vertices)
+    mesh.nface = len(faces)
+    return mesh
+
+def test_sliver_is_invertible():
+    dne = DNE.MeshDNE(sliver_mesh(), 0, 3, 0.1, 0, 0, 0, 0, "")
+    g, _, gdet = dne._gram_matrices()
+    assert gdet[-3] <= 0
+    assert np.isfinite(inv(g[-3])).all()
+
+def test_sweep_matches_meshdne_on_thin_triangle():
+    sweep = DNE.MeshDNESweep(sliver_mesh(), 0, 3, 0.1, outlierpercs=(None, 99.9), outliertypes=(0, 1), conditions=(None, 10**5))
+    for perc, outliertype, condition, dne in sweep.dne_table:
+        single = DNE.MeshDNE(sliver_mesh(), 0, 3, 0.1, int(condition is not None), int(perc is not None), perc or 0, outliertype, "")
+        assert not np.isnan(dne)
+        assert dne == single.DNE
@@ -0,0 +1,116 @@
+'''
+Created on Oct 18, 2026
+
+This module derives the connectivity of a triangulated 3D mesh (which polygons
+use each vertex, the unique edges and the polygons on each edge, mesh boundary
+edges and polygons, and which polygons share an edge) using the MeshTopology
+class. Everything is built with numpy sorting from the face array alone, so a
+single MeshTopology can be computed once per mesh and shared by all
+topographic variables. TopoMesh caches one in its topology attribute.
+'''
+
+from numpy import argsort, bincount, concatenate, cumsum, diff, ones, sort, unique, column_stack, empty, int64
+from scipy.sparse import csr_matrix
+from collections import defaultdict
+
+def csr_groups(keys, nkeys):
+    """Given integer keys, returns CSR pointer and index arrays listing positions of each key in ascending order."""
+    order = argsort(keys, kind='stable')
+    pointer = concatenate(([0], cumsum(bincount(keys, minlength=nkeys))))
+    return pointer, order
+
+class MeshTopology(object):
+    """Class for deriving and storing connectivity of triangulated polygon mesh data.
+
+    All attributes listed below are populated on instantiation. Polygons listed
+    per vertex or per edge are in ascending polygon index order.
+
+    Args:
+        faces (ndarray): Polygons with component vertex indices.
+        nvert (int): Number of vertices in mesh.
+
+    Attributes:
+        nvert (int): Number of vertices in mesh.
+        nface (int): Number of polygons in mesh.
+        vert_face_ptr (ndarray): CSR pointers, polygons of vertex i are
+            vert_face_idx[vert_face_ptr[i]:vert_face_ptr[i+1]].
+        vert_face_idx (ndarray): Polygon indices grouped by vertex.
+        vert_vert_ptr (ndarray): CSR pointers, neighbours of vertex i are
+            vert_vert_idx[vert_vert_ptr[i]:vert_vert_ptr[i+1]].
+        vert_vert_idx (ndarray): Vertex indices grouped by neighbouring vertex.
+        edges (ndarray): Unique edges as sorted pairs of vertex indices.
+        face_edges (ndarray): Edge indices of the three edges of each polygon.
+        edge_nface (ndarray): Number of polygons using each edge.
+        edge_face_ptr (ndarray): CSR pointers, polygons on edge k are
+            edge_face_idx[edge_face_ptr[k]:edge_face_ptr[k+1]].
+        edge_face_idx (ndarray): Polygon indices grouped by edge.
+        boundary_edges (ndarray): Edges used by exactly one polygon.
+        boundary_faces (ndarray): Polygons with at least one boundary edge.
+        face_pairs (ndarray): Unique pairs of polygons sharing an edge, lower
+            polygon index first.
+        face_adjacency (csr_matrix): Symmetric nface x nface matrix with ones
+            where polygons share an edge.
+    """
+    def __init__(self, faces, nvert):
+        self.nvert = int(nvert)
+        self.nface = len(faces)
+
+        faces = faces.astype(int64, copy=False)
+
+        # vertex -> polygon map
+        self.vert_face_ptr, order = csr_groups(faces.ravel(), self.nvert)
+        self.vert_face_idx = order // 3
+
+        # unique edges, keyed as lower vertex * nvert + higher vertex
+        edgeverts = sort(faces[:,[0,1,1,2,2,0]].reshape(-1,2), axis=1)
+        edgekeys, inverse = unique(edgeverts[:,0]*self.nvert + edgeverts[:,1], return_inverse=True)
+        self.edges = column_stack((edgekeys // max(self.nvert,1), edgekeys % max(self.nvert,1)))
+        self.face_edges = inverse.reshape(-1,3)
+
+        # edge -> polygon map
+        self.edge_face_ptr, order = csr_groups(self.face_edges.ravel(), len(self.edges))
+        self.edge_face_idx = order // 3
+        self.edge_nface = diff(self.edge_face_ptr)
+
+        self.boundary_edges = (self.edge_nface == 1).nonzero()[0]
+        self.boundary_faces = unique(self.edge_face_idx[self.edge_face_ptr[self.boundary_edges]])
+
+        # vertex -> neighbouring vertex map
+        self.vert_vert_ptr, order = csr_groups(self.edges.T.ravel(), self.nvert)
+        self.vert_vert_idx = concatenate((self.edges[:,1], self.edges[:,0]))[order]
+
+        self._get_face_pairs()
+
+        self.face_adjacency = csr_matrix((ones(2*len(self.face_pairs), bool),
+                                          (self.face_pairs.T.ravel(), self.face_pairs[:,::-1].T.ravel())),
+                                         shape=(self.nface, self.nface))
+
+    def _get_face_pairs(self):
+        """Generates unique pairs of polygons that share an edge."""
+        pairs = [empty((0,2), int64)]
+
+        # every pair of polygons among those on each edge, grouped by polygons per edge
+        for count in unique(self.edge_nface[self.edge_nface > 1]):
+            starts = self.edge_face_ptr[:-1][self.edge_nface == count]
+            for i in range(count):
+                for j in range(i+1, count):
+                    pairs.append(column_stack((self.edge_face_idx[starts+i], self.edge_face_idx[starts+j])))
+
+        pairs = concatenate(pairs)
+        pairs = pairs[pairs[:,0] != pairs[:,1]]
+        pairkeys = unique(pairs[:,0]*self.nface + pairs[:,1])
+        self.face_pairs = column_stack((pairkeys // max(self.nface,1), pairkeys % max(self.nface,1)))
+
+    def vert_tri_dict(self):
+        """Returns dictionary associating vertex index keys with lists of related polygon index values."""
+        faceindices = self.vert_face_idx.tolist()
+        pointer = self.vert_face_ptr.tolist()
+        return defaultdict(list, ((v, faceindices[pointer[v]:pointer[v+1]]) for v in range(self.nvert) if pointer[v+1] > pointer[v]))
+
+    def vert_faces(self, vertex):
+        """Returns polygon indices using a vertex."""
+        return self.vert_face_idx[self.vert_face_ptr[vertex]:self.vert_face_ptr[vertex+1]]
+
+    def vert_neighbors(self, vertex):
+        """Returns vertex indices sharing an edge with a vertex."""
+        return self.vert_vert_idx[self.vert_vert_ptr[vertex]:self.vert_vert_ptr[vertex+1]]
@@ -4,23 +4,26 @@ Created on Jan 10, 2016
 @author: Julia M. Winchester
 '''
 import plython
-import DNE
-import OPC
-import RFI
-import implicitfair
+import meshcheck
+import topology
+import normcore
 
-from collections import defaultdict
+# Metric modules (DNE, OPC, RFI, implicitfair) and their scipy dependencies are
+# imported inside the methods that use them, so that scripts computing a single
+# metric per process only pay for the imports that metric needs.
 
 class TopoMesh(plython.PlythonMesh):
     """A class for creating and interacting with triangulated polygon meshes and topographic variables.
     
     Class inherits from plython.PlythonMesh. Creates a list of Numpy ndarray objects containing 
-    triangulated polygon mesh data if provided with a path to a .ply file. Topographic variables
+    triangulated polygon mesh data if provided with a path to a .ply or .off file. Topographic variables
     are instanced as None and take the data types specified below when generated using the 
     ProcessSurface method. 
     
     Args:
-        filepath (str): Path to a .ply polygon mesh file
+        filepath (str): Path to a .ply or .off polygon mesh file
+        checklevel (str): Level of mesh check run once on import, one of 'off', 
+            'fast' or 'strict'. See meshcheck.MeshCheck class.
         
     Attributes:
         mesh (list): Triangulated polygon mesh data. Contains three ndarrays:
@@ -28,30 +31,59 @@ class TopoMesh(plython.PlythonMesh):
             and polygons with component vertex indices. 
         nvert (int): Number of vertices in mesh. 
         nface (int): Number of polygons in mesh.
+        polygons (list): Polygons as read from an .off file, before splitting
+            into triangles, as lists of vertex indices. None for .ply files.
         vertices (ndarray): Vertex XYZ points for mesh.
         faces (ndarray): Polygons with component vertex indices for mesh.
-        triverts (ndarray): Polygons with component vertex XYZ points for mesh.
+        triverts (ndarray): Polygons with component vertex XYZ points for mesh,
+            gathered from vertices and faces on access.
+        topology (MeshTopology object): Connectivity of mesh polygons, built on
+            first access and rebuilt after faces are reassigned. 
+        face_areas (ndarray): Areas of mesh polygons, computed on first access and
+            recomputed after vertices or faces are reassigned.
+        normals (list): Unit vertex normals and unit polygon normals of mesh,
+            computed on first access and recomputed after vertices or faces are reassigned.
+        meshcheck (MeshCheck object): Results of the most recent mesh check.
+        smoothcache (SmoothCache object): Implicit fairing factorizations and
+            results, reused when smoothing the same geometry with the same step size.
+            Created on first access.
+        meshreport (dict): Counts of problems found by the most recent mesh check.
         DNE (float): Total Dirichlet normal energy of mesh. 
         DNEscalars (ndarray): Scalars for visualizing DNE.
         conditionfaces (list): List of polygon face indices with high matrix condition numbers.
         boundaryfaces (list): List of polygon face indices forming mesh edges.
         outlierfaces (list): List of polygon face indices removed as outliers, with DNE values and face areas.
+        DNEsweep (list): Rows of outlier percentile, outlier type, condition number cutoff and DNE.
         RFI (float): Relief index of mesh (surface area/projected area).
         surfarea (float): 3D surface area of mesh. 
         projarea (float): 2D surface area of mesh projected on XY plane. 
         OPCR (float): Orientation patch count rotated for mesh. 
         OPClist (list): Orientation patch counts at 8 rotations for mesh.
+        OPCpatches (list): Counted patch of each polygon at 8 rotations for mesh.
         OPCscalars: Scalars for visualizing OPC. 
+        OPCsweep (list): Orientation patch counts over a sweep of rotations.
+        OPCsweepmean (float): Mean of OPCsweep.
+        OPCsweepsd (float): Standard deviation of OPCsweep.
+        OPCsweeprange (float): Range of OPCsweep (largest minus smallest).
     
     """
-    def __init__(self, filepath=""):
+    def __init__(self, filepath="", checklevel="fast"):
+        self._topology = None
+        self._face_areas = None
+        self._normals = None
+        self._smoothcache = None
+        
         super(TopoMesh,self).__init__(filepath)
         
+        self.meshcheck = None
+        self.meshreport = None
+        
         self.DNE = None
         self.DNEscalars = None
         self.conditionfaces = None
         self.boundaryfaces = None
         self.outlierfaces = None
+        self.DNEsweep = None
         
         self.RFI = None
         self.surfarea = None
@@ -63,7 +95,33 @@ class TopoMesh(plython.PlythonMesh):
         
         self.OPCR = None
         self.OPClist = None
+        self.OPCpatches = None
         self.OPCscalars = None
+        self.OPCsweep = None
+        self.OPCsweepmean = None
+        self.OPCsweepsd = None
+        self.OPCsweeprange = None
+        
+        if filepath != "":
+            self.CheckMesh(checklevel)
+        
+    def CheckMesh(self, level="fast", clean=False, weldtol=0):
+        """Checks mesh for degenerate, duplicate and non-manifold polygons and unused vertices.
+        
+        For details on args, see meshcheck.MeshCheck class. Metrics reuse these results
+        instead of checking polygons themselves while the mesh is unchanged.
+        
+        Args:
+            level (str): 'off', 'fast' or 'strict'.
+            clean (bool): If true, weld vertices and remove degenerate, duplicate and 
+                unreferenced elements from the mesh before checking.
+            weldtol (float): Snapping distance for welding vertices.
+            
+        """
+        self.check_for_mesh(self.CheckMesh)
+        
+        self.meshcheck = meshcheck.MeshCheck(self, level, clean, weldtol)
+        self.meshreport = self.meshcheck.report
         
     def GenerateDNE(self, dosmooth, smoothit, smoothstep, docondition, dooutlier, outlierperc, outliertype, filename):
         """Calculates Dirichlet normal energy (surface bending) from mesh data.
@@ -81,6 +139,7 @@ class TopoMesh(plython.PlythonMesh):
             
         """
         self.check_for_mesh(self.GenerateDNE)
+        import DNE
         
         surfcurv = DNE.MeshDNE(self, dosmooth, smoothit, smoothstep, docondition, dooutlier, outlierperc, outliertype, filename)
         self.DNE = surfcurv.DNE
@@ -88,12 +147,41 @@ class TopoMesh(plython.PlythonMesh):
         self.conditionfaces = surfcurv.high_condition_faces
         self.boundaryfaces = surfcurv.boundary_faces
         self.outlierfaces = surfcurv.outlier_faces
+        
+    def GenerateDNESweep(self, dosmooth, smoothit, smoothstep, outlierpercs=(99.9,), outliertypes=(0,), conditions=(10**5,)):
+        """Calculates Dirichlet normal energy for every combination of outlier and condition number settings.
+        
+        For details on args, see DNE.MeshDNESweep class. 
+        
+        Args:
+            dosmooth (bool): If true, do implicit fair smooth. 
+            smoothit (int): Iterations of smoothing
+            smoothstep (float): Smoothing step size. 
+            outlierpercs (list): Outlier percentiles, None for no outlier removal. 
+            outliertypes (list): Outlier types, 1 for energy*area and 0 for energy. 
+            conditions (list): Condition number cutoffs, None for no condition number control. 
+            
+        """
+        self.check_for_mesh(self.GenerateDNESweep)
+        import DNE
+        
+        surfsweep = DNE.MeshDNESweep(self, dosmooth, smoothit, smoothstep, outlierpercs, outliertypes, conditions)
+        self.DNEsweep = surfsweep.dne_table
           
-    def GenerateRFI(self):
-        """Calculates relief index (surface relief) from mesh data."""
+    def GenerateRFI(self, method="raster", resolution=1000):
+        """Calculates relief index (surface relief) from mesh data.
+        
+        For details on args, see RFI.MeshRFI class.
+        
+        Args:
+            method (str): Projected area method, 'raster', 'exact' or 'plot'.
+            resolution (int): Pixels along the longer side of the mesh for 'raster'.
+            
+        """
         self.check_for_mesh(self.GenerateRFI)
+        import RFI
         
-        surfrelf = RFI.MeshRFI(self)
+        surfrelf = RFI.MeshRFI(self, method, resolution)
         self.RFI = surfrelf.RFI
         self.surfarea = surfrelf.surfarea
         self.projarea = surfrelf.projarea
@@ -102,42 +190,115 @@ class TopoMesh(plython.PlythonMesh):
         self.redpixie = surfrelf.redpixie
         self.pixelratio = surfrelf.pixelratio
         
-    def GenerateOPCR(self, minpatch):
+    def GenerateOPCR(self, minpatch, retain="full"):
         """Calculates orientation patch count rotated (surface complexity) from mesh data.
         
         For details on args see OPC.MeshOPCR class. 
         
         Args:
-            minpatch (int): Minimum size for counting patches.
+            minpatch (int or list): Minimum size for counting patches, or list
+                of sizes to give one OPCR (and OPClist) per size.
+            retain (str): 'counts', 'labels' or 'full'. OPCpatches is set for
+                'labels' and 'full', OPCscalars only for 'full'. 
             
         """
         self.check_for_mesh(self.GenerateOPCR)
+        import OPC
         
-        surfcomp = OPC.MeshOPCR(self, minpatch)
+        surfcomp = OPC.MeshOPCR(self, minpatch, retain)
         self.OPCR = surfcomp.OPCR
         self.OPClist = surfcomp.opc_list
-        self.OPCscalars = surfcomp.colormap_list[0]
+        self.OPCpatches = surfcomp.patches_list if retain != "counts" else None
+        self.OPCscalars = surfcomp.colormap() if retain == "full" else None
         
-    def implicit_fair_mesh(self, iterations, step):
-        self.get_vert_tri_dict()
-        faired_vertices = implicitfair.smooth(self.vertices, self.faces, iterations, step, self.vert_tri_dict)
-        self.vertices = faired_vertices
-        self.mesh[0] = faired_vertices
+    def GenerateOPCSweep(self, minpatch, rotations=64):
+        """Calculates orientation patch count at many rotations around the Z-axis, for testing sensitivity of OPC to mesh orientation.
+        
+        For details on args see OPC.MeshOPCSweep class. 
         
-        for i in range(len(self.triverts)):
-            self.triverts[i] = self.vertices[self.faces[i]]
+        Args:
+            minpatch (int or list): Minimum size for counting patches.
+            rotations (int or list): Number of rotations evenly spaced over 45
+                degrees, or list of rotation angles in degrees.
             
-        self.mesh[1] = self.triverts
+        """
+        self.check_for_mesh(self.GenerateOPCSweep)
+        import OPC
+        
+        surfsweep = OPC.MeshOPCSweep(self, minpatch, rotations)
+        self.OPCsweep = surfsweep.opc_list
+        self.OPCsweepmean = surfsweep.OPCR
+        self.OPCsweepsd = surfsweep.OPCsd
+        self.OPCsweeprange = surfsweep.OPCrange
+        
+    def implicit_fair_mesh(self, iterations, step):
+        """Smooths mesh vertices by implicit fairing. Vertices are left unchanged and "!" is returned if smoothing fails."""
+        smoothed = self.smoothcache.smooth(self.vertices, self.faces, iterations, step)
+        if isinstance(smoothed, str):
+            print("Cholesky error")
+            return smoothed
+        self.vertices = smoothed
     
     def get_vert_tri_dict(self):
         """Generates dictionary associating vertex index keys with related polygon index values.""" 
-        self.vert_tri_dict = defaultdict(list)
-        
-        for findex, face in enumerate(self.faces):
-            for vertex in face:
-                self.vert_tri_dict[vertex].append(findex)
+        self.vert_tri_dict = self.topology.vert_tri_dict()
+    
+    @property
+    def smoothcache(self):
+        """Implicit fairing cache of mesh, see implicitfair.SmoothCache class. Created on first access."""
+        if self._smoothcache is None:
+            import implicitfair
+            self._smoothcache = implicitfair.SmoothCache()
+        return self._smoothcache
+    
+    @property
+    def vertices(self):
+        """Vertex XYZ points for mesh. Reassigning vertices clears cached polygon areas."""
+        return self._vertices
+    
+    @vertices.setter
+    def vertices(self, vertices):
+        self._vertices = vertices
+        self._face_areas = None
+        self._normals = None
+    
+    @property
+    def faces(self):
+        """Polygons with component vertex indices for mesh. Reassigning faces clears cached topology and polygon areas."""
+        return self._faces
+    
+    @faces.setter
+    def faces(self, faces):
+        self._faces = faces
+        self._topology = None
+        self._face_areas = None
+        self._normals = None
+    
+    @property
+    def face_areas(self):
+        """Cached array of polygon areas for the current vertices and faces."""
+        if self._face_areas is None:
+            self.check_for_mesh('face_areas')
+            self._face_areas = normcore.facearea(self.vertices, self.faces)
+        return self._face_areas
+    
+    @property
+    def normals(self):
+        """Cached [vertex normals, polygon normals] for the current vertices and faces, see normcore.computenormal."""
+        if self._normals is None:
+            self.check_for_mesh('normals')
+            self._normals = normcore.computenormal(self.vertices, self.faces, topology=self.topology)
+        return self._normals
+    
+    @property
+    def topology(self):
+        """Cached MeshTopology object for the current faces, see topology.MeshTopology class."""
+        if self._topology is None:
+            self.check_for_mesh('topology')
+            self._topology = topology.MeshTopology(self.faces, len(self.vertices))
+        return self._topology
     
     def check_for_mesh(self, function="function"):
-        if self.mesh == None:
+        if self.vertices is None or self.faces is None:
             raise ValueError('A mesh has not been imported, %s cannot proceed.' % function)
         
\ No newline at end of file